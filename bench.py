@@ -0,0 +1,549 @@
+#!/usr/bin/python
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+# benchmarks for the SPQR code. Run with
+# the names of the benchmarks you want, or none to run them all:
+#   python bench.py regions
+
+import sys, os, time, random, tempfile, pygame
+
+from scripts import spqr_defines as SPQR
+from scripts import spqr_data as SDATA
+from scripts import spqr_headless as SHEADLESS
+from scripts import spqr_scenario as SSCENARIO
+from scripts import spqr_save as SSAVE
+from scripts import spqr_replay as SREPLAY
+from scripts import spqr_gui as SGFX
+from scripts import spqr_window as SWINDOW
+from scripts import spqr_widgets as SWIDGET
+from scripts import spqr_events as SEVENT
+from scripts.maps import spqr_map as SMAP
+from scripts.maps import spqr_city as SCITY
+from scripts.maps import spqr_economy as SECONOMY
+from scripts.units import spqr_unit as SUNITS
+
+def timeIt(routine, *args):
+	"""Call routine with args, return (seconds taken, result)"""
+	start = time.time()
+	result = routine(*args)
+	return time.time() - start, result
+
+def report(name, seconds, count):
+	"""Print the timing for a single test"""
+	print "  %-28s %9.4fs  %9.2fus per call" % (name, seconds, (seconds * 1000000.0) / count)
+
+def loadRegionMasks():
+	"""Load the region images and masks as mainInit() would, but
+	   without a display. Returns the size of the map"""
+	masks = []
+	for region in SDATA.iterRegions():
+		image = pygame.image.load(SPQR.GFX_F + "/map/regions/" + region.image + ".png")
+		region.rect.width = image.get_width()
+		region.rect.height = image.get_height()
+		name = region.image + "_mask"
+		masks.append([name, pygame.image.load(SPQR.GFX_F + "/map/regions/" + name + ".png")])
+	SDATA.updateRegionMasks(masks)
+	return pygame.image.load(SPQR.GFX_F + "/map/map.jpg").get_size()
+
+def benchRegionClick(clicks = 5000):
+	"""Compare the region index against the old linear mask scan"""
+	width, height = loadRegionMasks()
+	seconds, result = timeIt(SDATA.buildRegionIndex, width, height)
+	report("build region index", seconds, 1)
+	random.seed(1)
+	points = [(random.randint(0, width - 1), random.randint(0, height - 1))
+			  for i in range(clicks)]
+	def scan():
+		return [SDATA.scanRegions(x, y) for x, y in points]
+	def lookup():
+		return [SDATA.regionClicked(x, y) for x, y in points]
+	seconds, old = timeIt(scan)
+	report("linear scan", seconds, clicks)
+	seconds, new = timeIt(lookup)
+	report("region index", seconds, clicks)
+	hits = len([i for i in new if i != False])
+	diff = len([i for i in range(clicks) if old[i] != new[i]])
+	print "  %d clicks, %d hit a region, %d differ" % (clicks, hits, diff)
+
+def addTestUnits(count):
+	"""Spread count new units over the map, ignoring stacking limits"""
+	stacking = SPQR.MAX_STACKING
+	SPQR.MAX_STACKING = count + 1
+	regions = [i.image for i in SDATA.iterRegions()]
+	for i in range(count):
+		unit = SUNITS.CUnit("bench_unit_" + str(i), "rome_legion", store = SDATA.data.map.store)
+		SDATA.data.map.addUnit(regions[i % len(regions)], unit)
+	SPQR.MAX_STACKING = stacking
+
+def benchUnitClick(clicks = 5000):
+	"""Compare the unit grid against testing every unit"""
+	addTestUnits(SPQR.MAX_STACKING * len(SDATA.data.map.regions))
+	random.seed(2)
+	# click around the city positions, where the units are
+	points = []
+	for i in range(clicks):
+		position = random.choice(SDATA.data.map.regions.values()).city_position
+		points.append((position.x + random.randint(-SPQR.UNIT_WIDTH, SPQR.UNIT_WIDTH * 2),
+					   position.y + random.randint(-SPQR.UNIT_HEIGHT, SPQR.UNIT_HEIGHT * 2)))
+	def scan():
+		return [SDATA.scanUnits(x, y) for x, y in points]
+	def lookup():
+		return [SDATA.unitClicked(x, y) for x, y in points]
+	seconds, old = timeIt(scan)
+	report("unit scan", seconds, clicks)
+	seconds, new = timeIt(lookup)
+	report("unit grid", seconds, clicks)
+	hits = len([i for i in new if i != False])
+	print "  %d clicks, %d hit a unit" % (clicks, hits)
+
+def scanUnitName(name):
+	"""Find a unit by name the way spqr_data used to"""
+	for region in SDATA.iterRegions():
+		for unit in region.units:
+			if unit.name == name:
+				return unit
+
+def benchUnitLookup(count = 1000, lookups = 20000):
+	"""Compare the unit registry against scanning every region"""
+	addTestUnits(count)
+	random.seed(3)
+	names = [random.choice(SDATA.data.map.units.keys()) for i in range(lookups)]
+	def scan():
+		for name in names:
+			scanUnitName(name).moves_left
+	def registry():
+		for name in names:
+			SDATA.getUnitMoves(name)
+	seconds, result = timeIt(scan)
+	report("scan by name", seconds, lookups)
+	seconds, result = timeIt(registry)
+	report("unit registry", seconds, lookups)
+	regions = [i.image for i in SDATA.iterRegions()]
+	def move():
+		for name in names:
+			SDATA.data.map.moveUnit(name, random.choice(regions))
+	seconds, result = timeIt(move)
+	report("move by name", seconds, lookups)
+
+def benchTurns(turns = 100):
+	"""Time whole turns of unit movement, with no display"""
+	SDATA.addUnits()
+	seconds, moves = timeIt(SHEADLESS.simulateTurns, turns, 4)
+	report("turn", seconds, turns)
+	report("unit move", seconds, max(moves, 1))
+	print "  %d turns, %d moves" % (turns, moves)
+
+def writeTestMap(filename, count):
+	"""Write a map YAML file of count regions in a square grid, with
+	   every region bordering the ones around it and each edge region
+	   a port linked to the next edge region"""
+	side = int(count ** 0.5) + 1
+	outfile = open(filename, "w")
+	for i in range(count):
+		x, y = i % side, i // side
+		outfile.write("- name: \"region_%d\"\n" % i)
+		outfile.write("  xpos: %d\n  ypos: %d\n" % (x * 40, y * 40))
+		outfile.write("  colour_r: 184\n  colour_g: 37\n  colour_b: 37\n")
+		outfile.write("  unit_x: %d\n  unit_y: %d\n" % (x * 40 + 10, y * 40 + 10))
+		outfile.write("  city: \"City %d\"\n" % i)
+		if x == 0 and i + side < count:
+			outfile.write("  naval:\n    - name: \"region_%d\"\n" % (i + side))
+		outfile.write("  borders:\n")
+		for j in [i - side, i - 1, i + 1, i + side]:
+			if j >= 0 and j < count and (j // side == y or j % side == x):
+				outfile.write("    - name: \"region_%d\"\n" % j)
+	outfile.close()
+
+def benchScenario(count = 5000):
+	"""Time loading a large map from YAML, then from the cache"""
+	folder = tempfile.mkdtemp()
+	filename = os.path.join(folder, "map.yml")
+	writeTestMap(filename, count)
+	cache = SSCENARIO.cacheName(filename)
+	seconds, result = timeIt(SSCENARIO.compileMap, filename)
+	report("parse yaml", seconds, 1)
+	seconds, result = timeIt(SMAP.CMap, filename)
+	report("first start (compile)", seconds, 1)
+	seconds, result = timeIt(SMAP.CMap, filename)
+	report("next start (cache)", seconds, 1)
+	seconds, data = timeIt(SSCENARIO.loadMap, filename)
+	report("cache only", seconds, 1)
+	# touch the file: it has to be hashed, but not compiled
+	os.utime(filename, None)
+	seconds, result = timeIt(SSCENARIO.loadMap, filename)
+	report("touched file", seconds, 1)
+	print "  %d regions, %d borders, cache is %d bytes" % \
+		(len(data["regions"]), len(data["edges"]), os.path.getsize(cache))
+	os.remove(cache)
+	os.remove(filename)
+	os.rmdir(folder)
+
+def searchMoves(world, region, moves):
+	"""Find the regions within moves of region by searching the
+	   borders every time, as highlightMoves would have to"""
+	found = set([region])
+	edge = [region]
+	result = []
+	for i in range(moves):
+		level = []
+		for name in edge:
+			for j in world.getNeighbors(name):
+				if j not in found:
+					found.add(j)
+					level.append(j)
+		result.extend(level)
+		edge = level
+	return result
+
+def benchMoves(count = 5000, lookups = 5000):
+	"""Compare the stored move ranges against searching the borders"""
+	folder = tempfile.mkdtemp()
+	filename = os.path.join(folder, "map.yml")
+	writeTestMap(filename, count)
+	world = SMAP.CMap(filename)
+	random.seed(5)
+	queries = [(random.choice(world.region_names[1:]), random.randint(1, SPQR.MAX_MOVES))
+			   for i in range(lookups)]
+	def search():
+		return [searchMoves(world, region, moves) for region, moves in queries]
+	def lookup():
+		return [world.getMoves(region, moves) for region, moves in queries]
+	seconds, old = timeIt(search)
+	report("search borders", seconds, lookups)
+	seconds, result = timeIt(world.land.buildAllReach)
+	report("build all ranges", seconds, 1)
+	seconds, new = timeIt(lookup)
+	report("range lookup", seconds, lookups)
+	diff = len([i for i in range(lookups) if set(old[i]) != set(new[i])])
+	print "  %d lookups, %d differ" % (lookups, diff)
+	os.remove(SSCENARIO.cacheName(filename))
+	os.remove(filename)
+	os.rmdir(folder)
+
+def benchPaths(count = 5000, queries = 200):
+	"""Time finding routes, and then finding them again from the cache"""
+	folder = tempfile.mkdtemp()
+	filename = os.path.join(folder, "map.yml")
+	writeTestMap(filename, count)
+	world = SMAP.CMap(filename)
+	random.seed(6)
+	names = world.region_names[1:]
+	pairs = [(random.choice(names), random.choice(names)) for i in range(queries)]
+	def routes():
+		return [world.paths.route(a, b, SPQR.PATH_MIXED) for a, b in pairs]
+	def ranges():
+		return [world.paths.reachable(a, SPQR.MAX_MOVES) for a, b in pairs]
+	seconds, result = timeIt(routes)
+	report("shortest path", seconds, queries)
+	seconds, result = timeIt(routes)
+	report("shortest path (cached)", seconds, queries)
+	world.paths.invalidate()
+	seconds, result = timeIt(ranges)
+	report("reachable", seconds, queries)
+	seconds, result = timeIt(ranges)
+	report("reachable (cached)", seconds, queries)
+	os.remove(SSCENARIO.cacheName(filename))
+	os.remove(filename)
+	os.rmdir(folder)
+
+def economyTurns(count, turns, vectorised):
+	"""Run the economy of count cities for turns. Returns (economy, income)"""
+	economy = SECONOMY.CEconomy(vectorised)
+	random.seed(7)
+	for i in range(count):
+		city = SCITY.CCity("City " + str(i), "roman_medium")
+		city.population = random.randint(1000, 100000)
+		city.happiness = random.randint(0, SPQR.CITY_HAPPY_MAX)
+		city.direct_tax = random.randint(0, 4)
+		economy.addCity(city)
+	income = 0
+	for i in range(turns):
+		income += economy.step()
+	return economy, income
+
+def benchEconomy(count = 10000, turns = 1000, slow_turns = 10):
+	"""Time the city economy, with numpy and with a loop over the cities"""
+	if SECONOMY.numpy != None:
+		seconds, result = timeIt(economyTurns, count, turns, True)
+		report("numpy turn", seconds, turns)
+	else:
+		print "  numpy not installed, skipping the vectorised test"
+	# the loop is far slower, so only do a few turns
+	seconds, result = timeIt(economyTurns, count, slow_turns, False)
+	report("loop turn", seconds, slow_turns)
+	if SECONOMY.numpy != None:
+		fast = economyTurns(count, slow_turns, True)
+		print "  %d cities, results match: %s" % (count, fast[1] == result[1])
+
+def testGame(filename, units):
+	"""Return game data using the map file, with units spread over it"""
+	info = SDATA.CInfo()
+	info.map = SMAP.CMap(filename)
+	stacking = SPQR.MAX_STACKING
+	SPQR.MAX_STACKING = units + 1
+	regions = info.map.region_names[1:]
+	for i in range(units):
+		unit = SUNITS.CUnit("bench_unit_" + str(i), "rome_legion", 3 + (i % 3),
+							SUNITS.unitStats(i % 10, 5, 5), naval = (i % 7) == 0,
+							store = info.map.store)
+		info.map.addUnit(regions[i % len(regions)], unit)
+	SPQR.MAX_STACKING = stacking
+	return info
+
+def benchSave(count = 5000, units = 100000):
+	"""Time saving and loading a large game, and check they match"""
+	folder = tempfile.mkdtemp()
+	filename = os.path.join(folder, "map.yml")
+	savefile = os.path.join(folder, "game.sav")
+	writeTestMap(filename, count)
+	info = testGame(filename, units)
+	info.year = 100
+	info.treasury = 123456
+	random.seed(8)
+	for name in random.sample(info.map.units.keys(), units // 10):
+		info.map.units[name].moves_left = 1
+	info.map.economy.step()
+	seconds, result = timeIt(SSAVE.CSnapshot, info)
+	report("snapshot", seconds, 1)
+	seconds, thread = timeIt(SSAVE.save, info, savefile)
+	report("save (game waits)", seconds, 1)
+	seconds, result = timeIt(SSAVE.waitForSave)
+	report("save (background)", seconds, 1)
+	loaded = SDATA.CInfo()
+	loaded.map = SMAP.CMap(filename)
+	seconds, result = timeIt(SSAVE.load, savefile, loaded)
+	report("load", seconds, 1)
+	report("load per unit", seconds, units)
+	# now check we got back what we saved
+	diff = 0
+	for name, unit in info.map.units.iteritems():
+		other = loaded.map.units.get(name)
+		if other == None or [unit.region, unit.moves, unit.moves_left, unit.naval, unit.image] != \
+				[other.region, other.moves, other.moves_left, other.naval, other.image]:
+			diff += 1
+	for name, region in info.map.regions.iteritems():
+		if region.city.population != loaded.map.regions[name].city.population:
+			diff += 1
+	if [info.year, info.treasury] != [loaded.year, loaded.treasury]:
+		diff += 1
+	print "  %d regions, %d units, save is %d bytes, %d differ" % \
+		(count, units, os.path.getsize(savefile), diff)
+	os.remove(savefile)
+	os.remove(SSCENARIO.cacheName(filename))
+	os.remove(filename)
+	os.rmdir(folder)
+
+def benchAutosave(count = 5000, units = 100000, turns = 20):
+	"""Time turns with autosave on, and check a snapshot is not
+	   changed by the game carrying on after it was taken"""
+	folder = tempfile.mkdtemp()
+	filename = os.path.join(folder, "map.yml")
+	writeTestMap(filename, count)
+	info = testGame(filename, units)
+	save_folder = SPQR.SAVE_F
+	SPQR.SAVE_F = folder
+	seconds, result = timeIt(SSAVE.CSnapshot, info)
+	report("snapshot", seconds, 1)
+	snapshot = result
+	before = dict([[i.name, i.moves_left] for i in info.map.units.itervalues()])
+	for unit in info.map.units.itervalues():
+		unit.moves_left = 0
+	seconds, result = timeIt(info.initNewTurn)
+	report("turn, no autosave", seconds, 1)
+	# the snapshot should still have the values from before
+	savefile = os.path.join(folder, "snapshot.sav")
+	SSAVE.writeSnapshot(snapshot, savefile)
+	loaded = SDATA.CInfo()
+	loaded.map = SMAP.CMap(filename)
+	SSAVE.load(savefile, loaded)
+	diff = len([i for i in loaded.map.units.itervalues() if i.moves_left != before[i.name]])
+	print "  snapshot taken before changing %d units, %d differ" % (units, diff)
+	info.autosave = 1
+	def play():
+		for i in range(turns):
+			info.initNewTurn()
+		SSAVE.waitForSave()
+	seconds, result = timeIt(play)
+	report("turn, autosave every turn", seconds, turns)
+	saves = [i for i in os.listdir(folder) if i.endswith(".sav")]
+	print "  %d autosave files (%d slots)" % (len(saves) - 1, SPQR.AUTOSAVE_SLOTS)
+	SPQR.SAVE_F = save_folder
+	for i in saves:
+		os.remove(os.path.join(folder, i))
+	os.remove(SSCENARIO.cacheName(filename))
+	os.remove(filename)
+	os.rmdir(folder)
+
+def gameState(info):
+	"""Return the parts of the game that a replay should get back"""
+	units = [(i.name, i.region, i.moves_left) for i in info.map.units.itervalues()]
+	units.sort()
+	return [info.year, info.treasury, units]
+
+def benchReplay(turns = 200):
+	"""Record some turns, then time playing them back"""
+	folder = tempfile.mkdtemp()
+	save_folder = SPQR.SAVE_F
+	SPQR.SAVE_F = folder
+	SDATA.addUnits()
+	SREPLAY.record(SDATA.data)
+	seconds, moves = timeIt(SHEADLESS.simulateTurns, turns, 9)
+	report("play turn", seconds, turns)
+	commands = SDATA.data.map.log.commands
+	SREPLAY.stop(SDATA.data)
+	played = gameState(SDATA.data)
+	seconds, result = timeIt(SREPLAY.replay)
+	report("replay command", seconds, max(result, 1))
+	print "  %d commands, %.0f a second, log is %d bytes, same game: %s" % \
+		(result, result / max(seconds, 0.000001), os.path.getsize(SREPLAY.replayName(".log")),
+		 result == commands and gameState(SDATA.data) == played)
+	# and replay just part of the game
+	seconds, result = timeIt(SREPLAY.replay, None, None, turns // 2)
+	report("replay half the turns", seconds, 1)
+	SPQR.SAVE_F = save_folder
+	for i in os.listdir(folder):
+		os.remove(os.path.join(folder, i))
+	os.rmdir(folder)
+
+def startGui():
+	"""Start the gui, with no display or sound, if not already started"""
+	if hasattr(SGFX.gui, "screen"):
+		return
+	SHEADLESS.useDummyDrivers()
+	SGFX.gui.mainInit(SPQR.SCREEN_WIDTH, SPQR.SCREEN_HEIGHT, False, False)
+
+def tiledFrame(width, height):
+	"""Draw a window frame the way CWindow used to, with a blit for every
+	   4 pixels of each edge and then for each pixel left over"""
+	gui = SGFX.gui
+	image = pygame.Surface((width, height))
+	image.fill(SPQR.BGUI_COL)
+	top = gui.iHeight("win_tl")
+	offset = width - gui.iWidth("win_rgt")
+	for y in range(top, height - 3, 4):
+		image.blit(gui.image("win_lft_lg"), (0, y))
+		image.blit(gui.image("win_rgt_lg"), (offset, y))
+	for y in range(height - ((height - top) % 4), height):
+		image.blit(gui.image("win_lft"), (0, y))
+		image.blit(gui.image("win_rgt"), (offset, y))
+	left = gui.iWidth("win_tl")
+	offset = height - gui.iHeight("win_bot")
+	for x in range(left, width - 3, 4):
+		image.blit(gui.image("win_top_lg"), (x, 0))
+		image.blit(gui.image("win_bot_lg"), (x, offset))
+	for x in range(width - ((width - left) % 4), width):
+		image.blit(gui.image("win_top"), (x, 0))
+		image.blit(gui.image("win_bot"), (x, offset))
+	for name, x, y in [["win_tl", 0, 0], ["win_bl", 0, height - gui.iHeight("win_bl")],
+					   ["win_br", width - gui.iWidth("win_br"), height - gui.iHeight("win_bl")],
+					   ["win_tr", width - gui.iWidth("win_br"), 0]]:
+		image.blit(gui.image(name), (x, y))
+	return image
+
+def benchDialogs(count = 1000):
+	"""Open and close dialogs of a few different sizes, as the messagebox
+	   and the other dialogs do, and compare against the old frame tiling"""
+	startGui()
+	random.seed(5)
+	sizes = [(random.randrange(200, 400, 20), random.randrange(60, 300, 20))
+			 for i in range(count)]
+	def tiled():
+		for width, height in sizes:
+			tiledFrame(width + (2 * SPQR.WINSZ_SIDE), height + SPQR.WINSZ_TOP + SPQR.WINSZ_BOT)
+	def dialogs():
+		for width, height in sizes:
+			SGFX.gui.addWindow(SWINDOW.CWindow(-1, -1, width, height, "Benchmark", True))
+			SGFX.gui.drawArea(SGFX.gui.windows[-1].rect)
+			SGFX.gui.killTopWindow()
+			SGFX.gui.drawGUIDirty()
+	seconds, result = timeIt(tiled)
+	report("tiled frame", seconds, count)
+	SWINDOW.frames.clear()
+	SWINDOW.strips.clear()
+	seconds, result = timeIt(dialogs)
+	report("open and close dialog", seconds, count)
+	seconds, result = timeIt(dialogs)
+	report("dialog, frames cached", seconds, count)
+	print "  %d sizes of window, %d frames cached" % (len(set(sizes)), len(SWINDOW.frames))
+
+def benchItemList(count = 10000):
+	"""Show the unit list with lots of units, scroll through all of
+	   it and sort it by each column"""
+	startGui()
+	addTestUnits(count)
+	seconds, itemlist = timeIt(SWIDGET.CItemList, SPQR.SPACER, SPQR.SPACER,
+							   SEVENT.CUnitRows(), None, None, 300)
+	report("build unit list", seconds, 1)
+	rows = itemlist.rows
+	view = itemlist.listarea.rect.h
+	surface = pygame.Surface((rows.get_width(), view))
+	def scroll():
+		for ypos in range(0, rows.get_height() - view, rows.row_height):
+			rows.blitTo(surface, (0, 0), (0, ypos, rows.get_width(), view))
+	seconds, result = timeIt(scroll)
+	steps = max((rows.get_height() - view) // rows.row_height, 1)
+	report("scroll one row", seconds, steps)
+	columns = len(rows.source.types)
+	def sort():
+		for column in range(columns):
+			rows.sortBy(column)
+	seconds, result = timeIt(sort)
+	report("sort by a column", seconds, columns)
+	seconds, result = timeIt(sort)
+	report("sort again, keys cached", seconds, columns)
+	seconds, result = timeIt(rows.sortBy, columns - 1)
+	report("reverse the sort", seconds, 1)
+	# now units move one at a time, each moving just it's own row
+	names = rows.order[:1000]
+	def change():
+		for name in names:
+			SDATA.getUnit(name).moves_left = 0
+			rows.changed(name)
+	seconds, result = timeIt(change)
+	report("re-sort one changed row", seconds, len(names))
+	# the other columns keep their keys up to date as well
+	seconds, result = timeIt(rows.sortBy, 1)
+	report("sort by another column", seconds, 1)
+	print "  %d rows, %d row images kept" % (len(rows.order), len(rows.cache))
+
+BENCHMARKS = [["regions", benchRegionClick],
+			  ["units", benchUnitClick],
+			  ["registry", benchUnitLookup],
+			  ["turns", benchTurns],
+			  ["scenario", benchScenario],
+			  ["moves", benchMoves],
+			  ["paths", benchPaths],
+			  ["economy", benchEconomy],
+			  ["save", benchSave],
+			  ["autosave", benchAutosave],
+			  ["replay", benchReplay],
+			  ["dialogs", benchDialogs],
+			  ["itemlist", benchItemList]]
+
+def main():
+	"""Run the benchmarks asked for on the command line"""
+	names = sys.argv[1:]
+	for name, routine in BENCHMARKS:
+		if names == [] or name in names:
+			print "[SPQR] Benchmark:", name
+			# every benchmark starts with fresh game data
+			SDATA.data = SDATA.CInfo()
+			SDATA.data.autosave = 0
+			routine()
+
+if __name__ == "__main__":
+	main()
+
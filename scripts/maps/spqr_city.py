@@ -14,11 +14,36 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 
+def column(name):
+	"""Return a property for the named economy value. Until the city
+	   is added to an economy the value is held by the city itself,
+	   afterwards it is read from and written to the economy's column"""
+	def getValue(self):
+		if self.economy == None:
+			return self.values[name]
+		return self.economy.getValue(name, self.row)
+	def setValue(self, value):
+		if self.economy == None:
+			self.values[name] = value
+		else:
+			self.economy.setValue(name, self.row, value)
+	return property(getValue, setValue)
+
 class CCity(object):
 	"""Defines a city in SPQR"""
+	population = column("population")
+	happiness = column("happiness")
+	food_consumption = column("food_consumption")
+	direct_tax = column("direct_tax")
+	indirect_tax = column("indirect_tax")
+
 	def __init__(self, name, image):
 		self.name = name
 		self.image = image
+		# the economy this city is part of, and it's row there
+		self.economy = None
+		self.row = 0
+		self.values = {}
 		self.population = 40000
 		self.happiness = 5
 		self.food_consumption = 2000
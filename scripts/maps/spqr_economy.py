@@ -0,0 +1,148 @@
+#!/usr/bin/python
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+from __future__ import absolute_import
+from .. import spqr_defines as SPQR
+import threading
+from array import array
+# numpy lets us do every city at once. Without it, we do them one by one
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+# the economy of all the cities is held here, as a column for each value
+# with a row for each city. The cities themselves just point to their row.
+# As with the unit store, a snapshot shares the columns, and a column is
+# only copied when it next changes
+
+COLUMNS = ["population", "happiness", "food_consumption", "direct_tax", "indirect_tax"]
+
+class CEconomy(object):
+	"""Holds the values of all cities, and works out each turn. Set
+	   vectorised to False to not use numpy even if we have it"""
+	def __init__(self, vectorised = True):
+		self.vectorised = vectorised and numpy != None
+		self.count = 0
+		self.columns = {}
+		for name in COLUMNS:
+			if self.vectorised == True:
+				self.columns[name] = numpy.zeros(16, dtype = numpy.int64)
+			else:
+				self.columns[name] = array('l')
+		# the columns that are shared with a snapshot
+		self.shared = set()
+		self.lock = threading.Lock()
+
+	def writable(self, name):
+		"""Return the named column, ready to be changed. If a snapshot
+		   shares it, it is copied first"""
+		if name in self.shared:
+			self.lock.acquire()
+			if name in self.shared:
+				if self.vectorised == True:
+					self.columns[name] = self.columns[name].copy()
+				else:
+					self.columns[name] = self.columns[name][:]
+				self.shared.discard(name)
+			self.lock.release()
+		return self.columns[name]
+
+	def addCity(self, city):
+		"""Give the city a row, and make it use it. Returns the row"""
+		row = self.count
+		self.count += 1
+		for name in COLUMNS:
+			value = getattr(city, name)
+			column = self.writable(name)
+			if self.vectorised == True:
+				if row == len(column):
+					# out of room, so double the size
+					column = numpy.concatenate((column, numpy.zeros(len(column), dtype = numpy.int64)))
+					self.columns[name] = column
+				column[row] = value
+			else:
+				column.append(value)
+		city.economy = self
+		city.row = row
+		return row
+
+	def getValue(self, name, row):
+		return int(self.columns[name][row])
+
+	def setValue(self, name, row, value):
+		self.writable(name)[row] = value
+
+	def snapshot(self):
+		"""Return the columns as they are now, as a dict of arrays with
+		   a row for every city. Nothing is copied, so don't change them"""
+		columns = {}
+		self.lock.acquire()
+		for name in COLUMNS:
+			if self.vectorised == True:
+				# a numpy slice is a view, not a copy
+				columns[name] = self.columns[name][:self.count]
+			else:
+				columns[name] = self.columns[name]
+		self.shared = set(COLUMNS)
+		self.lock.release()
+		return columns
+
+	def step(self):
+		"""Work out a turn for every city. Returns the tax raised"""
+		if self.vectorised == True:
+			return self.stepColumns()
+		return self.stepRows()
+
+	def stepColumns(self):
+		"""As step(), but with numpy on the whole columns at once"""
+		size = self.count
+		population = self.writable("population")[:size]
+		happiness = self.writable("happiness")[:size]
+		direct = self.columns["direct_tax"][:size]
+		indirect = self.columns["indirect_tax"][:size]
+		income = int(((population * (direct + indirect)) // 100).sum())
+		population += (population * (happiness - SPQR.CITY_GROWTH_HAPPY)) // 1000
+		numpy.maximum(population, 0, out = population)
+		self.writable("food_consumption")[:size] = population // SPQR.CITY_FOOD_RATIO
+		target = SPQR.CITY_HAPPY_BASE - direct - (indirect // 2)
+		happiness += numpy.sign(target - happiness)
+		numpy.clip(happiness, 0, SPQR.CITY_HAPPY_MAX, out = happiness)
+		return income
+
+	def stepRows(self):
+		"""As step(), but one city at a time"""
+		population = self.writable("population")
+		happiness = self.writable("happiness")
+		food = self.writable("food_consumption")
+		direct = self.columns["direct_tax"]
+		indirect = self.columns["indirect_tax"]
+		income = 0
+		for i in range(self.count):
+			people = population[i]
+			happy = happiness[i]
+			income += (people * (direct[i] + indirect[i])) // 100
+			people = max(people + (people * (happy - SPQR.CITY_GROWTH_HAPPY)) // 1000, 0)
+			population[i] = people
+			food[i] = people // SPQR.CITY_FOOD_RATIO
+			target = SPQR.CITY_HAPPY_BASE - direct[i] - (indirect[i] // 2)
+			if target > happy:
+				happy += 1
+			elif target < happy:
+				happy -= 1
+			happiness[i] = min(max(happy, 0), SPQR.CITY_HAPPY_MAX)
+		return income
+
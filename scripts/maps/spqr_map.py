@@ -16,9 +16,18 @@
 
 from __future__ import absolute_import
 from .. import spqr_defines as SPQR
-import pygame, yaml
-import networkx as nx
+from .. import spqr_scenario as SSCENARIO
+import pygame, re
+from array import array
+# networkx is only needed to export the map as a graph
+try:
+	import networkx as nx
+except ImportError:
+	nx = None
 from . import spqr_city as SCITY
+from . import spqr_path as SPATH
+from . import spqr_economy as SECONOMY
+from ..units import spqr_unit as SUNITS
 
 class Position(object):
 	def __init__(self, position):
@@ -26,55 +35,304 @@ class Position(object):
 		self.y = position[1]
 
 class CMap(object):
-	def __init__(self):
+	def __init__(self, filename = SPQR.DATA_F + "/regions/map.yml"):
 		self.regions = {}
 		self.masks = {}
-		self.graph = nx.Graph()
-		# Load the map's regions from a file
-		var = yaml.load(open("./data/regions/map.yml"))
-		# Make a temp list with the borders
-		wlist=[]
-		# for every region we will import the specific data
-		for j in range(len(var)):
-			# we will add now a list with the connecting regions
-			ilist = []
-			for i in range(len(var[j]['borders'])):
-				ilist.append(var[j]['borders'][i]['name'])
-			wlist.append(ilist)
-			# Append the temp list to our data
-			self.regions[var[j]['name']] = CRegion(var[j]['name'],
-				var[j]['xpos'], var[j]['ypos'], (var[j]['colour_r'],
-				var[j]['colour_g'],var[j]['colour_b']),
-				(var[j]['unit_x'],var[j]['unit_y']), var[j]['city'])
-		# repeat again for graph connections
-		for j in range(len(var)):
-			self.graph.add_node(self.regions[var[j]['name']])
-			for connect in wlist[j]:
-				self.graph.add_edge(self.regions[var[j]['name']], self.regions[connect])
-		# sort the naval connections
-		self.computeNavalAreas(var)
-		
-	def computeNavalAreas(self, data):
-		"""A port has access to ports in the same area. Here we store all
-		   the naval regions in a hash list"""
-		for region in data:
-			if region.has_key("naval"):
-				for nregion in region["naval"]:
-					self.regions[region["name"]].naval_regions.append(nregion["name"])
+		# every region gets an id number, starting at 1. 0 is reserved for
+		# 'no region' in the region index, which maps map pixels to ids
+		self.region_names = [None]
+		self.region_index = None
+		self.index_width = 0
+		self.index_height = 0
+		# every unit on the map, by name. The region each unit is in is
+		# held by the region itself (and unit.region)
+		self.units = {}
+		# the store new units on this map should be made in
+		self.store = SUNITS.CUnitStore()
+		# the stores that hold those units, by id
+		self.unit_stores = {}
+		# if the game is being recorded, the log to add changes to
+		self.log = None
+		# spatial index of where the units are drawn
+		self.unit_grid = CUnitGrid()
+		# the values of every city, worked out each turn
+		self.economy = SECONOMY.CEconomy()
+		# Load the map's regions from a file (or it's cache)
+		var = SSCENARIO.loadMap(filename)
+		for name, xpos, ypos, colour, position, city, borders, naval, cost in var["regions"]:
+			region = CRegion(name, xpos, ypos, colour, position, city)
+			region.id = len(self.region_names)
+			region.move_cost = cost
+			# a port has access to ports in the same area
+			region.naval_regions = list(naval)
+			self.economy.addCity(region.city)
+			self.regions[name] = region
+			self.region_names.append(name)
+		# land borders go both ways. The edges index the region list, so
+		# the ids are all one more
+		links = []
+		for a, b in var["edges"]:
+			links.append((a + 1, b + 1))
+			links.append((b + 1, a + 1))
+		self.land = CAdjacency(len(self.region_names), links)
+		links = []
+		for region in self.regions.itervalues():
+			for name in region.naval_regions:
+				links.append((region.id, self.regions[name].id))
+		self.naval = CAdjacency(len(self.region_names), links)
+		# routes over the map, for the gui and the ai
+		self.paths = SPATH.CPathFinder(self)
 	
+	def buildRegionIndex(self, width, height):
+		"""Build the region index, an array the size of the map that holds
+		   the id of the region under every pixel. Call after the masks have
+		   been loaded. Afterwards, regionAt() is a single lookup"""
+		index = array('H', [0]) * (width * height)
+		# work backwards through the regions so that where masks overlap,
+		# the first region in region_names wins, as it does in the linear
+		# scan (SDATA.scanRegions)
+		for name in reversed(self.region_names[1:]):
+			region = self.regions[name]
+			mask = self.masks[name]
+			mwidth, mheight = mask.get_size()
+			# we only need the alpha value of each pixel
+			alpha = pygame.image.tostring(mask, "RGBA")[3::4]
+			for y in range(mheight):
+				ypos = region.rect.y + y
+				if ypos < 0 or ypos >= height:
+					continue
+				row = alpha[y * mwidth:(y + 1) * mwidth]
+				# copy across every run of solid pixels in this row
+				for run in re.finditer("[^\x00]+", row):
+					start = max(region.rect.x + run.start(), 0)
+					end = min(region.rect.x + run.end(), width)
+					if start < end:
+						offset = ypos * width
+						index[offset + start:offset + end] = array('H', [region.id]) * (end - start)
+		self.region_index = index
+		self.index_width = width
+		self.index_height = height
+		return True
+
+	def regionAt(self, x, y):
+		"""Return the name of the region at map co-ords x,y, or None.
+		   Only valid after buildRegionIndex() has been called"""
+		if x < 0 or y < 0 or x >= self.index_width or y >= self.index_height:
+			return None
+		return self.region_names[self.region_index[(y * self.index_width) + x]]
+
 	def getNeighbors(self, region):
-		return [i.image for i in self.graph.neighbors(self.regions[region])]
+		return [self.region_names[i] for i in self.land.neighbors(self.regions[region].id)]
+
+	def getNavalMoves(self, region):
+		return [self.region_names[i] for i in self.naval.neighbors(self.regions[region].id)]
+
+	def getMoves(self, region, moves, naval = False):
+		"""Return the names of all regions that can be reached from
+		   region in the given number of moves, nearest first"""
+		if naval == True:
+			links = self.naval
+		else:
+			links = self.land
+		return [self.region_names[i] for i in links.within(self.regions[region].id, moves)]
+
+	def getDistance(self, start, end, naval = False):
+		"""Return the number of moves from region start to end, or
+		   None if it can't be done in SPQR.MAX_MOVES"""
+		if naval == True:
+			links = self.naval
+		else:
+			links = self.land
+		return links.distance(self.regions[start].id, self.regions[end].id)
+
+	def toNetworkX(self):
+		"""Return the land borders as a networkx graph of the regions,
+		   or None if networkx is not installed"""
+		if nx == None:
+			return None
+		graph = nx.Graph()
+		graph.add_nodes_from([self.regions[i] for i in self.region_names[1:]])
+		for name in self.region_names[1:]:
+			region = self.regions[name]
+			for i in self.land.neighbors(region.id):
+				graph.add_edge(region, self.regions[self.region_names[i]])
+		return graph
 		
 	def addUnit(self, region, unit):
 		if len(self.regions[region].units) == SPQR.MAX_STACKING:
 			return False
+		if self.units.has_key(unit.name):
+			# names must be unique
+			return False
+		self.checkFull(None, region)
+		self.unit_stores[id(unit.store)] = unit.store
 		unit.region = region
 		self.regions[region].units.append(unit)
+		self.units[unit.name] = unit
+		position = self.regions[region].city_position
+		self.unit_grid.addUnit(unit, position.x, position.y)
+		if self.log != None:
+			self.log.addUnit(region, unit)
+		return True
+
+	def moveUnit(self, name, region):
+		"""Move the named unit to the given region. Does not check
+		   stacking limits or moves. Returns False if no such unit"""
+		unit = self.units.get(name)
+		if unit == None:
+			return False
+		self.checkFull(unit.region, region)
+		self.regions[unit.region].units.remove(unit)
+		self.regions[region].units.append(unit)
+		unit.region = region
+		position = self.regions[region].city_position
+		self.unit_grid.moveUnit(unit, position.x, position.y)
+		return True
+
+	def removeUnit(self, name):
+		"""Remove the named unit from the map. Returns the unit,
+		   or None if there was no such unit"""
+		unit = self.units.pop(name, None)
+		if unit == None:
+			return None
+		self.checkFull(unit.region, None)
+		self.regions[unit.region].units.remove(unit)
+		self.unit_grid.removeUnit(unit)
+		unit.region = None
+		return unit
+
+	def checkFull(self, old, new):
+		"""Call before a unit leaves region old for region new (either
+		   can be None). Routes can't go through full regions, so if
+		   one fills or empties the stored routes are out of date"""
+		if old != None and len(self.regions[old].units) == SPQR.MAX_STACKING:
+			self.paths.invalidate()
+		elif new != None and len(self.regions[new].units) == SPQR.MAX_STACKING - 1:
+			self.paths.invalidate()
+
+class CUnitGrid(object):
+	"""Spatial index of the unit boxes on the map. The map is split
+	   into square cells, and each cell holds the units whose box
+	   overlaps it, so finding a unit at a point is one cell lookup"""
+	def __init__(self, size = SPQR.UNIT_GRID_SIZE):
+		self.size = size
+		self.cells = {}
+		# for every unit name: the unit, it's box and the cells it is in
+		self.units = {}
+
+	def addUnit(self, unit, x, y):
+		"""Add the unit, drawn at map co-ords x,y, to the grid"""
+		if self.units.has_key(unit.name):
+			self.removeUnit(unit)
+		# the box includes the right and bottom edges
+		box = pygame.Rect(x, y, SPQR.UNIT_WIDTH + 1, SPQR.UNIT_HEIGHT + 1)
+		cells = []
+		for cx in range(box.left // self.size, ((box.right - 1) // self.size) + 1):
+			for cy in range(box.top // self.size, ((box.bottom - 1) // self.size) + 1):
+				self.cells.setdefault((cx, cy), []).append(unit)
+				cells.append((cx, cy))
+		self.units[unit.name] = [unit, box, cells]
 		return True
 
+	def removeUnit(self, unit):
+		"""Remove the unit from the grid. Returns False if it was not there"""
+		if not self.units.has_key(unit.name):
+			return False
+		for cell in self.units[unit.name][2]:
+			self.cells[cell].remove(unit)
+			if self.cells[cell] == []:
+				del self.cells[cell]
+		del self.units[unit.name]
+		return True
+
+	def moveUnit(self, unit, x, y):
+		"""Unit is now drawn at x,y, so update the grid"""
+		self.removeUnit(unit)
+		return self.addUnit(unit, x, y)
+
+	def unitAt(self, x, y):
+		"""Return the unit whose box holds x,y, or None"""
+		cell = self.cells.get((x // self.size, y // self.size))
+		if cell == None:
+			return None
+		for unit in cell:
+			if self.units[unit.name][1].collidepoint(x, y):
+				return unit
+		return None
+
+class CAdjacency(object):
+	"""Links between regions, by region id. Call with the number of ids
+	   and a list of (from, to) links. The links of region i are stored
+	   as links[start[i]:start[i + 1]], in the order they were given"""
+	def __init__(self, count, pairs):
+		lists = [[] for i in range(count)]
+		for a, b in pairs:
+			lists[a].append(b)
+		self.start = array('I', [0])
+		self.links = array('I')
+		for i in lists:
+			self.links.extend(i)
+			self.start.append(len(self.links))
+		# for each region, a list of the regions first reached after
+		# 1 move, 2 moves and so on up to SPQR.MAX_MOVES
+		self.reach = {}
+
+	def neighbors(self, id):
+		return self.links[self.start[id]:self.start[id + 1]]
+
+	def buildReach(self, id):
+		"""Work out, and store, what region id can reach in each move"""
+		levels = []
+		found = set([id])
+		edge = [id]
+		for move in range(SPQR.MAX_MOVES):
+			level = array('I')
+			for i in edge:
+				for j in self.links[self.start[i]:self.start[i + 1]]:
+					if j not in found:
+						found.add(j)
+						level.append(j)
+			if len(level) == 0:
+				break
+			# lowest id first, the same order the path finder gives
+			level = array('I', sorted(level))
+			levels.append(level)
+			edge = level
+		self.reach[id] = levels
+		return levels
+
+	def buildAllReach(self):
+		"""Work out the reach of every region now, rather than as needed"""
+		for i in range(1, len(self.start) - 1):
+			self.buildReach(i)
+
+	def within(self, id, moves):
+		"""Return a list of the region ids reachable from id in moves"""
+		levels = self.reach.get(id)
+		if levels == None:
+			levels = self.buildReach(id)
+		ids = []
+		for level in levels[:moves]:
+			ids.extend(level)
+		return ids
+
+	def distance(self, start, end):
+		"""Return the number of moves from start to end, or None"""
+		levels = self.reach.get(start)
+		if levels == None:
+			levels = self.buildReach(start)
+		for move in range(len(levels)):
+			if end in levels[move]:
+				return move + 1
+		return None
+
 class CRegion(object):
 	def __init__(self, image, x, y, colour, city_pos, city_name):
 		self.image = image
+		# id number in the region index, set by CMap
+		self.id = 0
+		# number of moves it takes to enter the region
+		self.move_cost = 1
 		self.naval_regions = []
 		self.rect = pygame.Rect(x, y, 0, 0)
 		self.colour = colour
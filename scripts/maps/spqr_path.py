@@ -0,0 +1,154 @@
+#!/usr/bin/python
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+from __future__ import absolute_import
+from .. import spqr_defines as SPQR
+from .. import spqr_lru as SLRU
+import heapq
+
+# finding routes over the map. Going into a region costs that region's
+# move_cost, and a region holding MAX_STACKING units can't be entered.
+# Routes can be over land, by sea (along the naval links) or mixed,
+# which uses both. The answers are kept until a unit moves. When every
+# region costs 1 and none are full, the ranges stored in the map's
+# adjacency tables are used instead of searching
+
+class CPathFinder(object):
+	"""Call with the map to find routes over"""
+	def __init__(self, world, size = SPQR.PATH_CACHE):
+		self.world = world
+		self.cache = SLRU.CLRUCache(size)
+		# cost of entering each region, and the full ones, by region id.
+		# Set to None when they need to be worked out again
+		self.costs = None
+		self.full = None
+
+	def invalidate(self):
+		"""Call when units have moved, or anything else that might
+		   change a route. All the stored answers are thrown away"""
+		self.cache.clear()
+		self.full = None
+
+	def setup(self):
+		"""Work out the move costs and full regions"""
+		names = self.world.region_names
+		if self.costs == None:
+			self.costs = [0] + [self.world.regions[i].move_cost for i in names[1:]]
+		if self.full == None:
+			self.full = set([i for i in range(1, len(names))
+							 if len(self.world.regions[names[i]].units) >= SPQR.MAX_STACKING])
+
+	def uniform(self, mode, moves):
+		"""Return True if a search in this mode would be a plain count
+		   of borders crossed, so the map's move ranges can be used"""
+		self.setup()
+		if mode == SPQR.PATH_MIXED or moves > SPQR.MAX_MOVES:
+			return False
+		if len(self.full) != 0:
+			return False
+		return max(self.costs[1:]) == 1 and min(self.costs[1:]) == 1
+
+	def links(self, mode):
+		"""Return the links we can use for the given mode"""
+		if mode == SPQR.PATH_LAND:
+			return [self.world.land]
+		elif mode == SPQR.PATH_NAVAL:
+			return [self.world.naval]
+		return [self.world.land, self.world.naval]
+
+	def search(self, start, mode, budget = None, goal = None):
+		"""Find the cheapest way to every region from region id start,
+		   stopping at budget moves or when goal is reached. Returns a
+		   dict of cost by region id, and a dict of where each was
+		   reached from"""
+		self.setup()
+		links = self.links(mode)
+		costs = {start:0}
+		parents = {start:0}
+		done = set()
+		heap = [(0, start)]
+		while heap:
+			cost, region = heapq.heappop(heap)
+			if region in done:
+				continue
+			done.add(region)
+			if region == goal:
+				break
+			for adjacency in links:
+				for i in adjacency.neighbors(region):
+					if i in self.full:
+						continue
+					new = cost + self.costs[i]
+					if budget != None and new > budget:
+						continue
+					if new < costs.get(i, new + 1):
+						costs[i] = new
+						parents[i] = region
+						heapq.heappush(heap, (new, i))
+		return costs, parents
+
+	def reachable(self, region, moves, mode = SPQR.PATH_LAND):
+		"""Return the names of all regions that can be reached from the
+		   named region with the given moves, cheapest first"""
+		key = ("reach", region, moves, mode)
+		result = self.cache.get(key)
+		if result != None:
+			return result
+		start = self.world.regions[region].id
+		if self.uniform(mode, moves) == True:
+			# every step costs 1 and nothing blocks, so the stored
+			# ranges of the map are the answer
+			links = self.links(mode)[0]
+			names = self.world.region_names
+			return self.cache.put(key, [names[i] for i in links.within(start, moves)])
+		costs, parents = self.search(start, mode, moves)
+		del costs[start]
+		order = sorted(costs.iterkeys(), key = lambda i: (costs[i], i))
+		return self.cache.put(key, [self.world.region_names[i] for i in order])
+
+	def route(self, start, end, mode = SPQR.PATH_LAND):
+		"""Return (cost, list of region names) of the cheapest route from
+		   start to end, including both, or None if there is no route"""
+		key = ("route", start, end, mode)
+		result = self.cache.get(key, False)
+		if result != False:
+			return result
+		first = self.world.regions[start].id
+		last = self.world.regions[end].id
+		costs, parents = self.search(first, mode, None, last)
+		if not costs.has_key(last):
+			return self.cache.put(key, None)
+		path = [last]
+		while path[-1] != first:
+			path.append(parents[path[-1]])
+		path.reverse()
+		return self.cache.put(key, (costs[last], [self.world.region_names[i] for i in path]))
+
+	def path(self, start, end, mode = SPQR.PATH_LAND):
+		"""Return the shortest route from start to end as a list
+		   of region names, or None if there isn't one"""
+		result = self.route(start, end, mode)
+		if result == None:
+			return None
+		return result[1]
+
+	def cost(self, start, end, mode = SPQR.PATH_LAND):
+		"""Return the moves needed to get from start to end, or None"""
+		result = self.route(start, end, mode)
+		if result == None:
+			return None
+		return result[0]
+
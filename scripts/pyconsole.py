@@ -27,6 +27,7 @@ from code import InteractiveConsole		# Gives us access to the python interpreter
 
 # my defines
 import spqr_defines as SPQR
+import spqr_text as STEXT
 
 __version__ = "0.5"
 
@@ -134,7 +135,7 @@ class Console:
 		self.txt_layer = pygame.Surface(self.size)
 		self.txt_layer.set_colorkey(self.bg_color)
 
-		self.font = pygame.font.Font("../gfx/fixed_width.ttf",14)		
+		self.font = pygame.font.Font(SPQR.GFX_F + "/fixed_width.ttf",14)		
 		self.font_height = self.font.get_linesize()
 		self.max_lines = (self.size[HEIGHT] / self.font_height) - 1
 		
@@ -285,8 +286,9 @@ class Console:
 			lines = self.c_out[-(self.max_lines+self.c_scroll):len(self.c_out)-self.c_scroll]
 			y_pos = self.size[HEIGHT]-(self.font_height*(len(lines)+1))
 			
+			# old lines are drawn again and again as the console scrolls
 			for line in lines:
-				tmp_surf = self.font.render(line, True, self.txt_color_o)
+				tmp_surf = STEXT.renderLine(line, self.font, self.txt_color_o)
 				self.txt_layer.blit(tmp_surf, (1, y_pos, 0, 0))
 				y_pos += self.font_height
 			# Draw Input
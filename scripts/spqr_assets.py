@@ -0,0 +1,154 @@
+#!/usr/bin/python
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+import os, time, threading, Queue, pygame
+
+import spqr_defines as SPQR
+
+# the images used by the gui. Reading the files is done by a few threads
+# at once, but converting the images has to be done by the main thread
+# as it needs the display. Images not needed at the start can be left
+# until they are first asked for
+
+class CAssets(dict):
+	"""A dictionary of images, indexed by name. Add the files first,
+	   and then call loadAll() to load all of those that are not lazy.
+	   A lazy image is loaded the first time it is looked up"""
+	def __init__(self):
+		dict.__init__(self)
+		# filename of every image we know of
+		self.files = {}
+		# images to leave until needed
+		self.lazy = set()
+		# for each image loaded, [seconds to decode, seconds to convert, lazy]
+		self.times = {}
+		self.load_time = 0.0
+
+	def addFile(self, name, filename, lazy = False):
+		"""Add the image file, to be known as name"""
+		self.files[name] = filename
+		if lazy == True:
+			self.lazy.add(name)
+
+	def addFolder(self, folder, lazy = False):
+		"""Add all the png files in the folder. The image is named
+		   after the file, without the .png"""
+		for name in os.listdir(folder):
+			if name[-4:] == ".png":
+				self.addFile(name[:-4], os.path.join(folder, name), lazy)
+
+	def setLazy(self, names):
+		"""Make sure the images named are not loaded until needed"""
+		self.lazy.update(names)
+
+	def decode(self, name):
+		"""Read the image file. Returns the image and the time taken"""
+		start = time.time()
+		image = pygame.image.load(self.files[name])
+		return image, time.time() - start
+
+	def convert(self, name, image, seconds):
+		"""Convert the image for fast blits, and store it"""
+		start = time.time()
+		# only png files will have an alpha channel
+		if self.files[name][-4:] == ".png":
+			image = image.convert_alpha()
+		else:
+			image = image.convert()
+		self.times[name] = [seconds, time.time() - start, name in self.lazy]
+		self[name] = image
+		return image
+
+	def __missing__(self, name):
+		"""Called when we don't have the image: load it if we can"""
+		if name not in self.files:
+			raise KeyError(name)
+		image, seconds = self.decode(name)
+		return self.convert(name, image, seconds)
+
+	def loadAll(self, workers = SPQR.ASSET_WORKERS, waiting = None):
+		"""Load every image that is not lazy. The files are read by the
+		   given number of threads. waiting, if given, is called often
+		   whilst we wait for them. Returns the number of images loaded.
+		   If an image can't be read, the error is raised here"""
+		start = time.time()
+		names = [i for i in self.files if i not in self.lazy and i not in self]
+		# start with the largest, so one doesn't get left to the end on it's own
+		names.sort(key = lambda i: os.path.getsize(self.files[i]), reverse = True)
+		todo = Queue.Queue()
+		for i in names:
+			todo.put(i)
+		done = Queue.Queue()
+		def work():
+			while True:
+				try:
+					name = todo.get_nowait()
+				except Queue.Empty:
+					return
+				try:
+					image, seconds = self.decode(name)
+				except Exception, error:
+					# pass it on, the main thread will raise it. Anything
+					# we let go would leave the main thread waiting forever
+					image, seconds = None, error
+				done.put((name, image, seconds))
+		threads = []
+		for i in range(min(workers, len(names))):
+			thread = threading.Thread(target = work)
+			thread.daemon = True
+			thread.start()
+			threads.append(thread)
+		error = None
+		for i in range(len(names)):
+			while True:
+				try:
+					name, image, seconds = done.get(True, 0.05)
+					break
+				except Queue.Empty:
+					if waiting != None:
+						waiting()
+			if image == None:
+				error = seconds
+				break
+			self.convert(name, image, seconds)
+		if error != None:
+			# take away the work left, wait for the threads to finish
+			# what they are doing, and then fail here
+			while True:
+				try:
+					todo.get_nowait()
+				except Queue.Empty:
+					break
+			for thread in threads:
+				thread.join()
+			raise error
+		self.load_time = time.time() - start
+		return len(names)
+
+	def report(self):
+		"""Return a string of how long each image took to load, the
+		   slowest first. Lazy images are marked with a *"""
+		times = [[i[0] + i[1], name, i[0], i[1], i[2]] for name, i in self.times.iteritems()]
+		times.sort(reverse = True)
+		string = "Images loaded: " + str(len(times)) + " of " + str(len(self.files))
+		string += " (startup %.3fs)\n" % self.load_time
+		string += "  decode  convert  name\n"
+		for total, name, decode, convert, lazy in times:
+			if lazy == True:
+				name += " *"
+			string += "%7.1fms %6.1fms  %s\n" % (decode * 1000.0, convert * 1000.0, name)
+		return string
+
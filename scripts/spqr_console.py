@@ -37,6 +37,22 @@ class CConsole(object):
 		   and id number, formatted for console output"""
 		return "No Roman units found"
 		
+	def showFrames(self):
+		"""Display the frame timings of the main loop"""
+		times = SGFX.gui.frame_times
+		if times == []:
+			return "No frames yet"
+		string = "Frames drawn: " + str(SGFX.gui.frames) + "\n"
+		string += "Last " + str(len(times)) + " frames (ms):\n"
+		string += "  average: " + str(sum(times) / len(times))
+		string += "  worst: " + str(max(times)) + "\n"
+		string += "Current fps: " + str(int(SGFX.gui.frame_clock.get_fps())) + "\n"
+		return string
+
+	def showImages(self):
+		"""Display how long the images took to load"""
+		return SGFX.gui.images.report()
+
 	def showWindows(self):
 		"""Display a list of the current windows"""
 		string=""
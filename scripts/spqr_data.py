@@ -14,8 +14,11 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 
-import pygame, sys, yaml
+import pygame, sys
+from collections import deque
 import spqr_defines as SPQR
+import spqr_scenario as SSCENARIO
+import spqr_save as SSAVE
 import maps.spqr_map as SMAP
 import player.spqr_player as SPLAYER
 import units.spqr_unit as SUNITS
@@ -26,8 +29,21 @@ import units.spqr_unit as SUNITS
 class CInfo(object):
 	def __init__(self):
 		self.year = SPQR.START_YEAR
+		self.treasury = SPQR.START_TREASURY
+		self.turn = 0
+		# moves made this turn, so they can be undone, and moves that
+		# have been undone, so they can be done again
+		self.undo_moves = deque(maxlen = SPQR.UNDO_LIMIT)
+		self.redo_moves = []
+		# save every so many turns, or never if 0
+		self.autosave = SPQR.AUTOSAVE_TURNS
 		self.map = SMAP.CMap()
 
+	def clearUndo(self):
+		"""Forget all the moves that could be undone or redone"""
+		self.undo_moves.clear()
+		self.redo_moves = []
+
 	def initNewTurn(self):
 		"""Call routine at end of turn. Resets all data
 		   to ensure system is ready for next turn"""
@@ -41,6 +57,50 @@ class CInfo(object):
 		# there is of course no year zero
 		if self.year == 0:
 			self.year = 1
+		# collect the taxes, and let the cities grow
+		self.treasury += self.map.economy.step()
+		# every unit can move again
+		for unit in self.map.units.itervalues():
+			unit.moves_left = unit.moves
+			unit.turn_done = False
+		# moves can't be undone once the turn is over
+		self.clearUndo()
+		self.turn += 1
+		if self.map.log != None:
+			self.map.log.newTurn()
+		if self.autosave != 0 and self.turn % self.autosave == 0:
+			# the slots are used in turn, so only the latest few are kept
+			SSAVE.autosave(self, (self.turn // self.autosave) % SPQR.AUTOSAVE_SLOTS)
+
+class CMoveCommand(object):
+	"""A move of a unit that can be undone. Holds the unit, the
+	   regions it moved from and to, and the moves it took"""
+	__slots__ = ["unit", "start", "end", "moves"]
+	def __init__(self, unit, start, end, moves):
+		self.unit = unit
+		self.start = start
+		self.end = end
+		self.moves = moves
+
+	def do(self):
+		"""Make the move. Returns False if the end region is full"""
+		if self.unit not in data.map.units:
+			return False
+		if len(data.map.regions[self.end].units) == SPQR.MAX_STACKING:
+			return False
+		data.map.moveUnit(self.unit, self.end)
+		data.map.units[self.unit].moves_left -= self.moves
+		return True
+
+	def undo(self):
+		"""Take back the move. Returns False if the start region is full"""
+		if self.unit not in data.map.units:
+			return False
+		if len(data.map.regions[self.start].units) == SPQR.MAX_STACKING:
+			return False
+		data.map.moveUnit(self.unit, self.start)
+		data.map.units[self.unit].moves_left += self.moves
+		return True
 
 def updateRegionMasks(masks):
 	for i in masks:
@@ -59,8 +119,7 @@ def iterUnits():
 			yield i
 
 def unitNaval(unit):
-	unit = getUnit(unit)
-	return unit.naval
+	return data.map.units[unit].naval
 
 def nextUnitToMove(unit = None):
 	"""Call this function to get the next unit we need to move.
@@ -69,10 +128,7 @@ def nextUnitToMove(unit = None):
 	   into alpabetical order and then send back the one after
 	   the given one"""
 	# so first, get a list of all moveable units
-	units = []
-	for region in data.map.regions.itervalues():
-		for i in region.units:
-			units.append(i.name)
+	units = data.map.units.keys()
 	# no units?
 	if len(units) == 0:
 		return None
@@ -90,9 +146,25 @@ def nextUnitToMove(unit = None):
 		# no match, just return the first one then
 		return units[0]
 
+def buildRegionIndex(width, height):
+	"""Build the pixel to region lookup, once the masks are known"""
+	return data.map.buildRegionIndex(width, height)
+
 def regionClicked(x, y):
 	"""Return name of region if clicked, or False"""
-	for i in iterRegions():
+	# use the region index if it has been built
+	if data.map.region_index == None:
+		return scanRegions(x, y)
+	name = data.map.regionAt(x, y)
+	if name == None:
+		return False
+	return name
+
+def scanRegions(x, y):
+	"""As regionClicked, but tests every region mask in turn, in the
+	   order the map lists them. Used before the region index exists"""
+	for name in data.map.region_names[1:]:
+		i = data.map.regions[name]
 		if i.rect.collidepoint(x, y):
 			# now just check against the mask
 			nx = x - i.rect.x
@@ -103,6 +175,13 @@ def regionClicked(x, y):
 
 def unitClicked(x, y):
 	"""Return name of unit clicked, or False"""
+	unit = data.map.unit_grid.unitAt(x, y)
+	if unit == None:
+		return False
+	return unit
+
+def scanUnits(x, y):
+	"""As unitClicked, but tests every unit in turn"""
 	for i in iterUnits():
 		xpos = data.map.regions[i.region].city_position.x
 		ypos = data.map.regions[i.region].city_position.y
@@ -112,45 +191,72 @@ def unitClicked(x, y):
 
 def addUnits():
 	"""Used at start of game to add all units"""
-	units=[]
-	# Load the map's units from a file
-	var = yaml.load(open("../data/units/unit.yml"))
+	# Load the map's units from a file (or it's cache)
+	var = SSCENARIO.loadUnits(SPQR.DATA_F + "/units/unit.yml")
 	# For every unit we load their data to a list
-	for i in var:
-		if i.has_key('naval'):
-			result = data.map.addUnit(i['location'], 
-									  SUNITS.CUnit(i['name'],
-									  i['image'], naval = i['naval']))
-		else:
-			result = data.map.addUnit(i['location'], SUNITS.CUnit(i['name'], i['image']))
+	for name, location, image, naval in var:
+		result = data.map.addUnit(location, SUNITS.CUnit(name, image, naval = naval,
+															 store = data.map.store))
 		if result == False:
-			print "Error: Too many units in ", i[0]
+			print "Error: Too many units in ", location
 			sys.exit(False)
 
 def moveUnit(unit, region):
 	"""Move the unit given to the new region
 	   Data is passed as strings"""
 	# current location big enough?
-	if data.map.regions[region].units == SPQR.MAX_STACKING:
+	if len(data.map.regions[region].units) == SPQR.MAX_STACKING:
 		print "Error: Exceeded max stacking for", unit, "to", region
 		return False
 	# check that the unit exists somewhere
-	for i in iterUnits():
-		if i.name == unit:
-			# ok, we have the unit, now just change things
-			data.map.regions[region].units.append(i)
-			# remove old unit from location
-			data.map.regions[i.region].units.remove(i)
-			i.region = region
-			i.moves_left -= 1
-			return True
-	print "Error: Couldn't find unit", unit, "to move"
-	return False
+	if data.map.units.has_key(unit) == False:
+		print "Error: Couldn't find unit", unit, "to move"
+		return False
+	# it costs as many moves as the route it took
+	distance = data.map.paths.cost(data.map.units[unit].region, region,
+								   getUnitPathMode(unit))
+	if distance == None:
+		distance = 1
+	moves = min(distance, data.map.units[unit].moves_left)
+	command = CMoveCommand(unit, data.map.units[unit].region, region, moves)
+	command.do()
+	data.undo_moves.append(command)
+	# a new move means the undone ones can't be done again
+	data.redo_moves = []
+	if data.map.log != None:
+		data.map.log.moveUnit(unit, region)
+	return True
+
+def undoMove():
+	"""Undo the last move made. Returns the move, or None if there
+	   was nothing to undo or the move couldn't be undone"""
+	if len(data.undo_moves) == 0:
+		return None
+	command = data.undo_moves[-1]
+	if command.undo() == False:
+		return None
+	data.undo_moves.pop()
+	data.redo_moves.append(command)
+	if data.map.log != None:
+		data.map.log.undoMove()
+	return command
+
+def redoMove():
+	"""Make the last move that was undone again. Returns the move,
+	   or None if there wasn't one or it can't be done"""
+	if len(data.redo_moves) == 0:
+		return None
+	command = data.redo_moves[-1]
+	if command.do() == False:
+		return None
+	data.redo_moves.pop()
+	data.undo_moves.append(command)
+	if data.map.log != None:
+		data.map.log.redoMove()
+	return command
 
 def getUnit(name):
-	for i in iterUnits():
-		if name == i.name:
-			return i
+	return data.map.units.get(name)
 
 def getUnitPosition(name):
 	region = getUnitRegion(name)
@@ -158,14 +264,13 @@ def getUnitPosition(name):
 	return position.x, position.y
 
 def getUnitMoves(name):
-	unit = getUnit(name)
-	return unit.moves_left
+	return data.map.units[name].moves_left
 
 def getUnitRegion(name):
-	for i in iterRegions():
-		for unit in i.units:
-			if unit.name == name:
-				return unit.region
+	unit = data.map.units.get(name)
+	if unit == None:
+		return None
+	return unit.region
 
 def getRegionUnits(name):
 	return data.map.regions[name].units
@@ -175,8 +280,7 @@ def getCityPosition(region):
 	return position.x, position.y
 
 def getUnitImage(name):
-	unit = getUnit(name)
-	return unit.image
+	return data.map.units[name].image
 
 def getRegion(region):
 	return data.map.regions[region]
@@ -185,7 +289,26 @@ def getNeighbors(region):
 	return data.map.getNeighbors(region)
 
 def getNavalMoves(region):
-	return data.map.regions[region].naval_regions
+	return data.map.getNavalMoves(region)
+
+def getMoves(region, moves, naval = False):
+	return data.map.getMoves(region, moves, naval)
+
+def getDistance(start, end, naval = False):
+	return data.map.getDistance(start, end, naval)
+
+def getUnitPathMode(name):
+	if data.map.units[name].naval == True:
+		return SPQR.PATH_NAVAL
+	return SPQR.PATH_LAND
+
+def getUnitRange(name):
+	"""Return the regions the unit can get to with the moves it has left"""
+	unit = data.map.units[name]
+	return data.map.paths.reachable(unit.region, unit.moves_left, getUnitPathMode(name))
+
+def getPath(start, end, mode = SPQR.PATH_LAND):
+	return data.map.paths.path(start, end, mode)
 
 data = CInfo()
 
@@ -16,6 +16,7 @@
 
 # we need some pygame variables:
 import pygame.locals as PYGAME
+import os.path
 
 # this file contains the global defines for spqr
 # as you can see, there are quite a few. However, most should be left
@@ -31,10 +32,35 @@ LAST_UPDATE			= "15th Jan 2011"
 CODELINES			= "5757"
 FULLSCREEN			= False
 
+# where SPQR lives, so it can be run from any folder
+ROOT_F				= os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+DATA_F				= os.path.join(ROOT_F, "data")
+GFX_F				= os.path.join(ROOT_F, "gfx")
+MUSIC_F				= os.path.join(ROOT_F, "music")
+# compiled map and unit data goes here. Change the version if the
+# format of the data changes, so old caches are not used
+CACHE_F				= os.path.join(ROOT_F, "cache")
+SCENARIO_VERSION	= 2
+# saved games go here. Again, change the version if the format changes
+SAVE_F				= os.path.join(ROOT_F, "saves")
+SAVE_FILE			= "game.sav"
+SAVE_VERSION		= 3
+# the game is saved every AUTOSAVE_TURNS turns (0 for never), using
+# AUTOSAVE_SLOTS files in turn
+AUTOSAVE_TURNS		= 5
+AUTOSAVE_SLOTS		= 3
+# recorded games are a save and a log, kept in SAVE_F with this name
+REPLAY_FILE			= "replay"
+REPLAY_VERSION		= 2
+# the number of moves that can be undone in a turn
+UNDO_LIMIT			= 100
+
 # before we go any further, this one is a must ;-)
 # currently adds debug menu bar , along with access to
 # a python console
 DEBUG_MODE		=	True
+# number of turns simulated when running with -b
+BATCH_TURNS			= 1000
 
 # now place the equivalent of some(!) defines
 SCREEN_WIDTH 		= 800
@@ -53,6 +79,12 @@ CHKBOX_SIZE			= 13
 # size of unit gfx
 UNIT_WIDTH			= 45
 UNIT_HEIGHT			= 41
+# size of the cells in the grid used to find units on the map
+UNIT_GRID_SIZE		= 128
+# the rendered map is split into square tiles of this size, and
+# at most MAP_TILE_CACHE of them are kept at any one time
+MAP_TILE_SIZE		= 256
+MAP_TILE_CACHE		= 64
 # box size for region icons
 REGION_ICON_SIZE	= 95
 
@@ -62,6 +94,13 @@ ROME_XPOS			= 1250
 ROME_YPOS			= 1150
 # maximum number of units in any region
 MAX_STACKING		= 4
+# most moves a unit can have in one turn
+MAX_MOVES			= 8
+# ways a unit can travel, and how many routes to remember
+PATH_LAND			= 0
+PATH_NAVAL			= 1
+PATH_MIXED			= 2
+PATH_CACHE			= 256
 
 # sizes of various gradiant bars used in ItemList widget
 GRADBAR_SIZES		= [64, 96, 128]
@@ -83,6 +122,12 @@ WIN_MENU			= 0
 # the images to load
 # just list the folders inside gfx: the game will pull all of the png files
 GRAPHICS_F			= ["gui", "icons", "units", "cities" ,"map/regions", "units/overlays"]
+# folders and images that are only loaded the first time they are used
+GRAPHICS_LAZY_F		= ["icons"]
+GRAPHICS_LAZY		= ["startup", "img_music", "test_image", "eagle", "soldier",
+					   "battle_info", "unit_graph", "city_infhex", "hex_border"]
+# number of threads that read the image files at startup
+ASSET_WORKERS		= 4
 
 # milliseconds between unit flash
 # (all animation times are in milliseconds)
@@ -91,6 +136,9 @@ ANIM_TIME			= 400
 MOVE_FRAME			= 24
 # number of milliseconds between clicks in a double-click (400 is the Gnome standard)
 DCLICK_SPEED		= 400
+# most frames per second to draw, and how many frames to keep timings of
+FRAME_FPS			= 60
+FRAME_HISTORY		= 120
 
 # mouse events as seen by the gui
 MOUSE_NONE			= 0
@@ -157,6 +205,18 @@ SCAREA_MINH			= 32
 WINSZ_SIDE			= 6
 WINSZ_TOP			= 24
 WINSZ_BOT			= 6
+# how many finished window frames (one per window size) to keep
+FRAME_CACHE			= 32
+# how many lines of rendered text to keep (see spqr_text.py)
+TEXT_CACHE			= 512
+# how many city name labels to keep. Only the cities near the view are
+# drawn at any one time, so this doesn't need to cover the whole map
+CITY_LABEL_CACHE	= 256
+# item lists draw their rows as they come into view, and keep the last
+# ROW_CACHE of them. ROW_OVERSCAN rows either side of the view are drawn
+# as well, so scrolling a little never has to wait for a row
+ROW_CACHE			= 256
+ROW_OVERSCAN		= 4
 
 # alpha is from 0 to 255, where 0 is transparent
 MENU_ALPHA			= 64
@@ -167,6 +227,15 @@ MENU_HLCOL			= (170, 83, 83)
 # start year is always 1 year before you want the game to start, as
 # the start of the first turn will increment it by 1
 START_YEAR			= -201
+START_TREASURY		= 10000
+# city economics. Each turn a city grows by (happiness - CITY_GROWTH_HAPPY)
+# people per thousand, eats one unit of food per CITY_FOOD_RATIO people and
+# pays direct_tax + indirect_tax per hundred people. Happiness moves by 1
+# a turn towards CITY_HAPPY_BASE - direct_tax - indirect_tax / 2
+CITY_GROWTH_HAPPY	= 3
+CITY_FOOD_RATIO		= 20
+CITY_HAPPY_BASE		= 9
+CITY_HAPPY_MAX		= 10
 
 # define all the colours we use as well
 BGUI_COL			= (238, 238, 230)
@@ -25,6 +25,9 @@ import spqr_widgets as SWIDGET
 import spqr_gui as SGFX
 import spqr_sound as SSFX
 import spqr_ybuild as SYAML
+import spqr_save as SSAVE
+import spqr_replay as SREPLAY
+import spqr_text as STEXT
 
 # thanks go to John Schanck for the following module
 import pyconsole
@@ -95,7 +98,9 @@ def miniMapDrag(handle, xpos, ypos):
 	# a fair bit here...
 	miniMapClick(handle, xpos, ypos)
 	while(True):
-		event = pygame.event.poll()
+		# we are outside the main loop, so show the map ourselves
+		SGFX.gui.flushRender()
+		event = pygame.event.wait()
 		if event.type == MOUSEBUTTONUP and event.button == 1:
 			# time to exit
 			return True
@@ -245,16 +250,43 @@ def menuNew(handle, xpos, ypos):
 	return True
 
 def menuLoad(handle, xpos, ypos):
-	"""Temp routine, just displays a messagebox for now"""
+	"""Load the newest saved game (which may be an autosave), and
+	   show the map as it was"""
+	# if the game is still being saved, let that finish first
+	SSAVE.waitForSave()
+	filename = SSAVE.latestSave()
+	if filename == None:
+		SGFX.gui.messagebox(SPQR.BUTTON_OK,
+			"There is no saved game to load.", "Load Game")
+		return True
+	if SREPLAY.load(filename, SDATA.data) == False:
+		SGFX.gui.messagebox(SPQR.BUTTON_OK,
+			"Sorry, the saved game could not be loaded.", "Load Game")
+		return True
+	# loaded from the welcome screen?
+	if SGFX.gui.windows[-1].modal == True:
+		killModalWindow(0, 0, 0)
+		SGFX.gui.deleteTopDirty()
+	# none of the old units are on the map now
+	SGFX.gui.clearMoves()
+	SGFX.gui.flushFlash()
+	SGFX.gui.clearFlash()
+	SGFX.gui.renderPixelMap()
+	SGFX.gui.updateGUI()
 	SGFX.gui.messagebox(SPQR.BUTTON_OK,
-		"Sorry, it is not possible to load games yet.","Load Game")
+		"Game loaded. The year is " + str(SDATA.data.year) + ".", "Load Game")
 	return True
 
 def menuSave(handle, xpos, ypos):
-	"""Temp routine, just displays a messagebox for now"""
-	SGFX.gui.messagebox(SPQR.BUTTON_OK,
-		"Sorry, save game has yet to be coded (more code to be done...)",
-		"Save Game")
+	"""Save the game. The game is written out on another thread, but
+	   we wait for it to finish so we can say if it worked"""
+	writer = SSAVE.save(SDATA.data)
+	writer.join()
+	if writer.result == True:
+		SGFX.gui.messagebox(SPQR.BUTTON_OK, "The game has been saved.", "Save Game")
+	else:
+		SGFX.gui.messagebox(SPQR.BUTTON_OK,
+			"Sorry, the game could not be saved.", "Save Game")
 	return True
 
 def showCity(handle, xpos, ypos):
@@ -269,7 +301,10 @@ def showCity(handle, xpos, ypos):
 	lbl_name.rect.y = 20
 	# a picture of city and surrounding area
 	picture = pygame.Surface((80, 80))
-	picture.blit(SGFX.gui.image("buffer"), (0, 0))
+	x, y = SDATA.getCityPosition(SDATA.data.map.regions["latium_et_campania"])
+	area = pygame.Rect(0, 0, 80, 80)
+	area.center = (x + (SPQR.UNIT_WIDTH / 2), y + (SPQR.UNIT_HEIGHT / 2))
+	SGFX.gui.renderMapArea(picture, area)
 	city_image = SWIDGET.buildUniqueImage(picture)
 	city_image.rect.x = 20
 	city_image.rect.y = 60
@@ -290,104 +325,106 @@ def showCity(handle, xpos, ypos):
 	SGFX.gui.addDirtyRect(window.drawWindow(), window.rect)
 	return True
 
+def keyUndo(handle, xpos, ypos):
+	"""Undo the last unit move"""
+	SGFX.gui.undoMove()
+	return True
+
+def keyRedo(handle, xpos, ypos):
+	"""Make the last undone unit move again"""
+	SGFX.gui.redoMove()
+	return True
+
 def menuEmpireSenate(handle, xpos, ypos):
 	"""Temp routine, just displays a messagebox for now"""
 	string = "It is not possible to visit the senate at this moment in time."
 	SGFX.gui.messagebox(SPQR.BUTTON_OK, string, "Visit Senate")
 	return True
 
-def menuEmpireMilitary(handle, xpos, ypos):
-	"""Routine sets up and displays the unit display box
+class CUnitRows(SWIDGET.CRowSource):
+	"""The rows of the unit list: one for every unit, by name"""
+	def __init__(self):
+		SWIDGET.CRowSource.__init__(self, [False, True, True, True],
+			["Image", "Unit Name", "Region", "Moves"])
+
+	def ids(self):
+		return sorted(SDATA.data.map.units.keys())
+
+	def cells(self, name):
+		unit = SDATA.getUnit(name)
+		return [SGFX.gui.image(unit.image), name, unit.region, str(unit.moves_left)]
+
+	def key(self, column):
+		if column == 0:
+			return SDATA.getUnitImage
+		elif column == 2:
+			return SDATA.getUnitRegion
+		elif column == 3:
+			return SDATA.getUnitMoves
+		return str
+
+	def widths(self):
+		# there are only a few unit images and regions, but lots of names
+		font = SGFX.gui.fonts[SPQR.FONT_VERA]
+		units = SDATA.data.map.units.values()
+		images = set([i.image for i in units])
+		names = [STEXT.textWidth(font, i.name) for i in units]
+		regions = [STEXT.textWidth(font, i) for i in SDATA.data.map.region_names[1:]]
+		return [max([SGFX.gui.iWidth(i) for i in images] + [0]), max(names + [0]),
+				max(regions + [0]), STEXT.textWidth(font, str(SPQR.MAX_MOVES))]
+
+class CCityRows(SWIDGET.CRowSource):
+	"""The rows of the statistics list: one for every city, by region"""
+	def __init__(self):
+		SWIDGET.CRowSource.__init__(self, [True, True, True, True],
+			["City", "Population", "Happiness", "Tax"])
+
+	def ids(self):
+		return SDATA.data.map.region_names[1:]
+
+	def cells(self, region):
+		city = SDATA.getRegion(region).city
+		return [city.name, str(city.population), str(city.happiness),
+				str(city.direct_tax + city.indirect_tax)]
+
+	def key(self, column):
+		def value(region):
+			city = SDATA.getRegion(region).city
+			if column == 0:
+				return city.name
+			elif column == 1:
+				return city.population
+			elif column == 2:
+				return city.happiness
+			return city.direct_tax + city.indirect_tax
+		return value
+
+def showItemList(source, title):
+	"""Show a modal window holding an item list of the rows in source.
 	   Always returns True"""
-	   
-	# OLD CODE TO DISPLAY EXAMPLE OF AN ITEMLIST
-	# TODO: Replace as soon as possible!
-	   
-	# we need to create the following data to creata an ItemList:
-	# lgui,x,y - gui pointer and x/y position (as per normal)
-	# a list to say what the column types are (where True is text)
-	# a list to give the column titles
-	# then a list of lists, each list giving the attributes for
-	# each column. Followed by the height of the total widget
-	# the column layout should be: Unit gfx, unit name, status, commander
-	# create the item list:
-	ilist = [False, True, True, False, True]
-	# and the column name list:
-	clist = ["Image", "Unit Name", "Moves", "Status", "Commander"]
-	# that was easy. Now create each list item. Firstly we need
-	# every unit that is Roman:
-	units = []
-	for i in SGFX.gui.data.troops.units:
-		if i.owner == SPQR.ROME_SIDE:
-			units.append(i.id_number)
-	# did we actually get any units?
-	if units == []:
-		SGFX.gui.messagebox(SPQR.BUTTON_OK, "There are no Roman units!", "Unit List")
-		return True
-
-	# now build up the column data that we need:
-	uid = []
-	ugfx = []
-	uname = []
-	umoves = []
-	ustatus = []
-	ucommander = []
-	for foo in units:
-		uid.append(foo)
-		i=SGFX.gui.data.troops.getIndexFromID(foo)
-		tunit=SGFX.gui.data.troops.units[i]
-		ugfx.append(SGFX.gui.images[tunit.image])
-		uname.append(tunit.name)
-		umoves.append(str(tunit.moves_left))
-		ustatus.append(SGFX.gui.returnGraphImage(i))
-		i2=SGFX.gui.data.getPeopleIndex(tunit.commander)
-		cname=SGFX.gui.data.people[i2].getShortName()
-		ucommander.append(cname)
-
-	# store the sort routines:
-	sort = [SGFX.gui.data.sortUnitImage,
-		 	SGFX.gui.data.sortUnitName,
-		 	SGFX.gui.data.sortUnitMoves,
-		 	SGFX.gui.data.sortUnitStatus,
-		 	SGFX.gui.data.sortUnitCommander]
-
-	# tie all of that up together and get the ItemList:
-	elements = []
-	elements.append(ilist)
-	elements.append(clist)
-	elements.append(ugfx)
-	elements.append(uname)
-	elements.append(umoves)
-	elements.append(ustatus)
-	elements.append(ucommander)
-	unitlist = SWIDGET.CItemList(SGFX.gui, SPQR.SPACER, SPQR.SPACER, elements, sort, uid, 300)
-	sclist = unitlist.listarea
-
+	itemlist = SWIDGET.CItemList(SPQR.SPACER, SPQR.SPACER, source, None, None, 300)
+	sclist = itemlist.listarea
 	# now we can actually build up our window. Let's make this as easy
 	# as possible. First off, get the size of the area we need:
-	wxsize = unitlist.rect.w
-	wysize = unitlist.rect.h + sclist.rect.h
-
+	wxsize = sclist.rect.w
+	wysize = itemlist.rect.h + sclist.rect.h
 	# activate stuff
-	unitlist.active = True
-	sclist.active = True	
+	itemlist.active = True
+	sclist.active = True
 	# build the window, and locate stuff
-	# let's have SPACER around the window as filler, except at the bottom,
-	# where we have SPACER - checkbox+label - SPACER:
+	# let's have SPACER around the window as filler
 	height = wysize + (SPQR.SPACER*3)
-	width = wxsize + ((SPQR.SPACER*2) + SGFX.gui.images[SPQR.SCROLL_TOP].get_width())	
+	width = wxsize + (SPQR.SPACER*2)
 	# now start to build the window
-	uwin = (SWINDOW.CWindow(-1, -1, width, height, "Unit List", True))	
-	uwin.addWidget(unitlist)
+	uwin = (SWINDOW.CWindow(-1, -1, width, height, title, True))
+	uwin.addWidget(itemlist)
 	uwin.addWidget(sclist)
 	uwin.modal = True
-	
 	# add the extra buttons
 	b1 = SWINDOW.CButtonDetails("Cancel", K_c, killModalWindow)
 	uwin.buildButtonArea([b1], False)
 	SGFX.gui.keyboard.setModalKeys(1)
 	index = SGFX.gui.addWindow(uwin)
-
 	# turn off unit animations for the moment
 	SGFX.gui.unitFlashAndOff()
 	# add the dirty rect details
@@ -395,14 +432,19 @@ def menuEmpireMilitary(handle, xpos, ypos):
 		SGFX.gui.windows[index].rect)
 	return True
 
+def menuEmpireMilitary(handle, xpos, ypos):
+	"""Routine sets up and displays the unit display box
+	   Always returns True"""
+	if SDATA.data.map.units == {}:
+		SGFX.gui.messagebox(SPQR.BUTTON_OK, "There are no units!", "Unit List")
+		return True
+	# only the units that can be seen are drawn, so this is quick
+	# however many units there are
+	return showItemList(CUnitRows(), "Unit List")
+
 def menuEmpireStatistics(handle, xpos, ypos):
-	"""Temp routine, just displays a messagebox for now"""
-	string = SPQR.CODELINES+" lines of Python source code\n"
-	string += "2.1 Mb of GFX\n"
-	string += "47 Litres of Coke\n\n"
-	string += "And counting..."
-	SGFX.gui.messagebox(SPQR.BUTTON_OK, string, "Statistics")
-	return True
+	"""Display the values of every city. Always returns True"""
+	return showItemList(CCityRows(), "Statistics")
 
 def menuHelpAbout(handle, xpos, ypos):
 	"""Simple messagebox with game info. Returns True"""
@@ -434,6 +476,8 @@ def keyShowKeys(handle, xpos, ypos):
 	message += "n - highlight next unit\n"
 	message += "r - Centre map on Rome\n"
 	message += "F1 - Help\n"
+	message += "CTRL+Z - Undo the last move\n"
+	message += "CTRL+Y - Redo the last undone move\n"
 	message += "CTRL+Q - Exit the game\n\n"
 	SGFX.gui.messagebox(SPQR.BUTTON_OK, message, "SPQR Help")
 	return True
@@ -687,7 +731,9 @@ def displayConsole(handle, xpos, ypos):
 					 "dunits":SGFX.gui.cfuncs.showUnits,
 					 "drunits":SGFX.gui.cfuncs.showRomanUnits,
 					 "dpeople":SGFX.gui.cfuncs.showPeople,
-					 "windows":SGFX.gui.cfuncs.showWindows})
+					 "windows":SGFX.gui.cfuncs.showWindows,
+					 "frames":SGFX.gui.cfuncs.showFrames,
+					 "images":SGFX.gui.cfuncs.showImages})
 	# console needs to stay displayed
 	SGFX.gui.console = True
 	while(True):
@@ -720,7 +766,7 @@ def windowTest(handle, xpos, ypos):
 	# get the window from a yaml file and this returns a list of indexes
 	# incase we import more than 1 window we get their indexes
 	# here we have 1 window so we get the first index
-	index = SYAML.createWindow("../data/layouts/window_test.yml")[0]
+	index = SYAML.createWindow(SPQR.DATA_F + "/layouts/window_test.yml")[0]
 	SGFX.gui.windows[index].modal = True
 	# we have to add modal keypresses ourselves
 	SGFX.gui.keyboard.setModalKeys(1)
@@ -25,6 +25,10 @@ import spqr_events as SEVENT
 import spqr_console as SCONSOLE
 import spqr_sound as SSFX
 import spqr_data as SDATA
+import spqr_tiles as STILES
+import spqr_assets as SASSETS
+import spqr_text as STEXT
+import spqr_lru as SLRU
 
 # class that holds the dirty rectangle updates
 class CDirtyRect(object):
@@ -42,6 +46,8 @@ class CGFXEngine(object):
 
 	def mainInit(self, width, height, fullscreen, load_screen= True):
 		"""Long, boring routine that initiates the gui"""
+		# sound has to be set up before the rest of pygame
+		SSFX.sound.initMixer()
 		pygame.init()
 		# ok, now init the basic screen
 		# done now so image.convert works when we load the images
@@ -50,18 +56,29 @@ class CGFXEngine(object):
 				HWSURFACE|FULLSCREEN|DOUBLEBUF)
 		else:
 			self.screen = pygame.display.set_mode((width, height), HWSURFACE|DOUBLEBUF)
-		self.images = {}
+		self.images = SASSETS.CAssets()
 		if load_screen == True:
 			self.displayLoadingScreen(width, height)
-		# next up is to load in some images into the gfx array
-		self.images["map"] = pygame.image.load("../gfx/map/map.jpg").convert()
-		# add a back buffer map render.. this will become the map that we render
-		foo = pygame.Surface((self.iWidth("map"), self.iHeight("map")))
-		self.images["buffer"] = foo
-		# we will need a copy of the board without the units rendered, for movement, flashing
-		# etc.. It is not stored with the other images, but I'll declare it here anyway. Start
-		# it with a dummy image:
-		self.map_render = pygame.Surface((self.iWidth("map"),  self.iHeight("map")))
+		# next up is to load in the images. Get all the filenames first
+		self.images.addFile("map", SPQR.GFX_F + "/map/map.jpg")
+		for i in SPQR.GRAPHICS_F:
+			self.images.addFolder(SPQR.GFX_F + "/" + i, i in SPQR.GRAPHICS_LAZY_F)
+		self.images.setLazy(SPQR.GRAPHICS_LAZY)
+		# keep the loading screen alive whilst we wait
+		self.images.loadAll(SPQR.ASSET_WORKERS, pygame.event.pump)
+		if SPQR.DEBUG_MODE == True:
+			print "[SPQR]: Loaded images in %.3fs" % self.images.load_time
+		# the map we actually display is rendered in tiles, and only
+		# where it can be seen. See renderMapArea() for what gets drawn
+		self.map_tiles = STILES.CMapTiles(self.iWidth("map"), self.iHeight("map"),
+										  self.renderMapArea)
+		# areas of the map that have changed, but are not yet on the screen
+		self.map_dirty = []
+		# list to hold possible moves being shown
+		self.map_click_moves = []
+		# unit that has it's moves left drawn over it, and where
+		self.unit_marked = None
+		self.marked_rect = pygame.Rect(0, 0, 0, 0)
 
 		self.windows = []
 		# the font that the messagebox will use:
@@ -70,6 +87,20 @@ class CGFXEngine(object):
 		self.over_button = False
 		# interrupt for timers?
 		self.timer = True
+		# are we panning the map? and by how much this frame
+		self.panning = False
+		self.pan_x = 0
+		self.pan_y = 0
+		# what needs drawing at the end of this frame
+		self.redraw_gui = False
+		self.redraw_map = False
+		self.update_rects = []
+		# screen areas to draw again from the map and windows this frame
+		self.gui_dirty = []
+		# keep the frame rate steady, and some stats on it
+		self.frame_clock = pygame.time.Clock()
+		self.frame_times = []
+		self.frames = 0
 		# item to check double-click against
 		self.dclick_handle = None
 		# store a simple console class
@@ -77,30 +108,27 @@ class CGFXEngine(object):
 		# console currently being displayed?
 		self.console = False
 		pygame.display.set_caption("SPQR "+SPQR.VERSION)
-		
-		# get all filenames:
-		files = []
-		for i in SPQR.GRAPHICS_F:
-			files.extend(["../gfx/" + i +"/" + name for name in os.listdir("../gfx/" + i + "/")])
-		# if it's a png, strip the name and insert it into a new hash
-		for i in files:
-			if i[-4:] == ".png":
-				self.images[i.split("/")[-1][:-4]] = pygame.image.load(i).convert_alpha()
 
 		# set up the fonts
 		pygame.font.init()
 		self.fonts = []
-		self.fonts.append(pygame.font.Font("../gfx/Vera.ttf", SPQR.FONT_STD))
-		self.fonts.append(pygame.font.Font("../gfx/Vera.ttf", SPQR.FONT_SMALL))
-		self.fonts.append(pygame.font.Font("../gfx/Vera.ttf", SPQR.FONT_LARGE))
+		self.fonts.append(pygame.font.Font(SPQR.GFX_F + "/Vera.ttf", SPQR.FONT_STD))
+		self.fonts.append(pygame.font.Font(SPQR.GFX_F + "/Vera.ttf", SPQR.FONT_SMALL))
+		self.fonts.append(pygame.font.Font(SPQR.GFX_F + "/Vera.ttf", SPQR.FONT_LARGE))
 
+		# tinted region images, built as needed by regionOverlay()
+		self.region_overlays = {}
+		# city names, drawn as needed by cityLabel(). They are held by the
+		# name, font, font size and style, so a renamed city or a change in
+		# font size gets a new label. Old ones are dropped, so renaming
+		# cities doesn't keep adding to them
+		self.city_labels = SLRU.CLRUCache(SPQR.CITY_LABEL_CACHE)
 		# update buffer images
 		self.updateMapData()
 		self.renderPixelMap()
 		# we have 2 blit areas for the flashing unit:
 		self.flash_draw = pygame.Surface((0, 0))
 		self.flash_erase = pygame.Surface((0, 0))
-		self.flash_old = pygame.Surface((0, 0))
 		# and the destination rect:
 		self.flash_rect = pygame.Rect(0, 0, 0, 0)
 		# index of troop we are flashing
@@ -154,12 +182,10 @@ class CGFXEngine(object):
 		# load other data required by mapboard
 		self.updateMiniMap()
 		self.flash_on = False
-		# list to hold possible moves being shown
-		self.map_click_moves = []
 
 	def displayLoadingScreen(self, width, height):
 		"""Displays the loading screen"""
-		load_screen = pygame.image.load("../gfx/load_screen.png").convert()
+		load_screen = pygame.image.load(SPQR.GFX_F + "/load_screen.png").convert()
 		self.screen.fill(SPQR.COL_BLACK)
 		xpos = (width - load_screen.get_width()) / 2
 		ypos = (height - load_screen.get_height()) / 2
@@ -188,66 +214,128 @@ class CGFXEngine(object):
 			if key[-5:] == "_mask":
 				i.append([key, self.image(key)])
 		SDATA.updateRegionMasks(i)
+		# now we have the masks, build the lookup for map clicks
+		SDATA.buildRegionIndex(self.iWidth("map"), self.iHeight("map"))
+
+	def regionOverlay(self, image, colour):
+		"""Return the named region image (or mask) with the colour added
+		   to it. The result is cached for each image, and only rebuilt
+		   if the colour asked for changes"""
+		cached = self.region_overlays.get(image)
+		if cached != None and cached[0] == colour:
+			return cached[1]
+		area = pygame.Surface(self.image(image).get_size()).convert()
+		area.fill(colour)
+		overlay = self.image(image).copy()
+		overlay.blit(area, (0, 0), None, pygame.BLEND_ADD)
+		self.region_overlays[image] = (colour, overlay)
+		return overlay
 
-	def renderRegions(self):
-		"""Draw all regions to the back buffer"""
+	def renderMapArea(self, surface, area, units = True):
+		"""Draw the given area of the map onto surface. This is where
+		   the map we display is generated, having rendered regions,
+		   cities, units, roads etc. The ordering of the blits, from
+		   first to last, is: Back map, Regions, Move highlights,
+		   Cities, Units. Set units to False to leave the units out"""
+		surface.blit(self.image("map"), (0, 0), area)
+		for i in SDATA.iterRegions():
+			if i.rect.colliderect(area):
+				surface.blit(self.regionOverlay(i.image, i.colour),
+							 (i.rect.x - area.x, i.rect.y - area.y))
+		for name in self.map_click_moves:
+			i = SDATA.getRegion(name)
+			if i.rect.colliderect(area):
+				surface.blit(self.regionOverlay(i.image + "_mask", SPQR.COL_WHITE),
+							 (i.rect.x - area.x, i.rect.y - area.y))
 		for i in SDATA.iterRegions():
-			# render the map
-			region = pygame.Surface(self.image(i.image).get_size()).convert()
-			region.fill(i.colour)
-			mask = self.image(i.image).copy()
-			mask.blit(region, (0, 0), None, pygame.BLEND_ADD)
-			self.image("buffer").blit(mask, (i.rect.x, i.rect.y))
+			if i.city != None and self.cityArea(i).colliderect(area):
+				self.renderSingleCity(i, surface, area)
+		if units == False:
+			return True
+		for i in SDATA.iterRegions():
+			if i.units == [] or self.unitArea(i).colliderect(area) == False:
+				continue
+			x, y = SDATA.getCityPosition(i)
+			x -= area.x
+			y -= area.y
+			# a marked unit is always drawn on top of the others
+			for unit in i.units:
+				if unit.name != self.unit_marked:
+					surface.blit(self.image(unit.image), (x, y))
+			if SDATA.getUnitRegion(self.unit_marked) == i.image:
+				surface.blit(self.image(SDATA.getUnitImage(self.unit_marked)), (x, y))
+				# no overlay for a unit that has used all of it's moves
+				if SDATA.getUnitMoves(self.unit_marked) > 0:
+					moves = "moves" + str(SDATA.getUnitMoves(self.unit_marked))
+					surface.blit(self.image(moves), (x, y))
+		return True
+
+	def unitArea(self, region):
+		"""Return the map area covered by the units in the region"""
+		x, y = SDATA.getCityPosition(region)
+		return pygame.Rect(x, y, SPQR.UNIT_WIDTH, SPQR.UNIT_HEIGHT)
+
+	def cityArea(self, region):
+		"""Return the map area covered by the city of a region, including
+		   the name. This also sets region.text_rect, the area of the name"""
+		x, y = SDATA.getCityPosition(region)
+		city = self.image(region.city.image).get_rect(topleft = (x, y))
+		# the label includes the border, so it's 2 pixels bigger than the text
+		w, h = self.cityLabel(region.city.name).get_size()
+		x -= int((w - 2 - SPQR.UNIT_WIDTH) / 2)
+		y += SPQR.UNIT_HEIGHT + 1
+		region.text_rect = pygame.Rect(x - 1, y - 1, w + 1, h + 1)
+		return city.union(region.text_rect)
+
+	def cityLabel(self, name, font = SPQR.FONT_VERA):
+		"""Return the image of a city name, with it's shadow and
+		   border. Labels are kept once drawn, as long as they are used
+		   often enough to stay in the cache"""
+		key = (name, font, self.fonts[font].get_height(), True)
+		label = self.city_labels.get(key)
+		if label == None:
+			self.fonts[font].set_bold(True)
+			text = self.fonts[font].render(name, True, SPQR.COL_WHITE)
+			shadow = self.fonts[font].render(name, True, SPQR.COL_BLACK)
+			self.fonts[font].set_bold(False)
+			# the border is half see-through black, and the text and
+			# it's shadow go on top of that
+			label = pygame.Surface((text.get_width() + 2, text.get_height() + 2), pygame.SRCALPHA)
+			label.fill((0, 0, 0, 127))
+			label.blit(shadow, (2, 2))
+			label.blit(text, (1, 1))
+			self.city_labels.put(key, label)
+		return label
 
 	def renderSingleRegion(self, region):
-		"""Update the regions cities and unit gfx to the back buffer"""
-		# first we erase the old unit + city gfx
+		"""Call when the region, it's city or units have changed"""
 		i = SDATA.getRegion(region)
-		pos = SDATA.getCityPosition(i)
-		self.image("buffer").blit(self.image("map"), pos,
-								  pygame.Rect(pos[0], pos[1], SPQR.UNIT_WIDTH, SPQR.UNIT_HEIGHT))
-		self.image("buffer").blit(self.image("map"), i.text_rect, i.text_rect)
-		# then we repair the border
-		area = pygame.Surface(self.image(i.image).get_size()).convert()
-		area.fill(i.colour)
-		mask = self.image(i.image).copy()
-		mask.blit(area, (0, 0), None, pygame.BLEND_ADD)
-		self.image("buffer").blit(mask, (i.rect.x, i.rect.y))
-		# either a city is there or not: if it is, then the text has already
-		# been blitted and we just need to blit the city, otherwise do nothing
+		self.addMapDirty(i.rect)
+		self.addMapDirty(self.unitArea(i))
 		if i.city != None:
-			self.renderSingleCity(i)
+			self.addMapDirty(self.cityArea(i))
 
-	def renderCities(self):
-		"""Draw all cities, and their names, on the board"""
-		for i in SDATA.iterRegions():
-			if i.city != None:
-				self.renderSingleCity(i)
+	def addMapDirty(self, rect):
+		"""Redraw the given area of the map. It will be shown at the
+		   end of this frame"""
+		rect = pygame.Rect(rect)
+		if rect.w == 0 or rect.h == 0:
+			return False
+		self.map_tiles.dirty(rect)
+		self.map_dirty.append(rect)
+		return True
 
-	def renderSingleCity(self, region):
-		self.fonts[SPQR.FONT_VERA].set_bold(True)
-		name = region.city.name
+	def renderSingleCity(self, region, surface, area):
+		"""Draw the city and it's name onto surface, which holds the
+		   given area of the map"""
 		x, y = SDATA.getCityPosition(region)
 		# draw the city
-		self.image("buffer").blit(self.image(region.city.image), (x, y))
-		# draw the text	
-		text = self.fonts[SPQR.FONT_VERA].render(name, True, SPQR.COL_WHITE)
-		shadow = self.fonts[SPQR.FONT_VERA].render(name, True, SPQR.COL_BLACK)
-		border = pygame.Surface((text.get_width() + 2, text.get_height() + 2))
-		border.fill(SPQR.COL_BLACK)
-		border.set_alpha(127)
-		x -= int((text.get_width() - SPQR.UNIT_WIDTH) / 2)
+		surface.blit(self.image(region.city.image), (x - area.x, y - area.y))
+		# and then the name, which is all one image
+		label = self.cityLabel(region.city.name)
+		x -= int((label.get_width() - 2 - SPQR.UNIT_WIDTH) / 2)
 		y += SPQR.UNIT_HEIGHT + 1
-		self.image("buffer").blit(border,(x -1, y -1))
-		self.image("buffer").blit(shadow, (x + 1, y + 1))
-		self.image("buffer").blit(text, (x, y))
-		# save the text area rect for later
-		region.text_rect = pygame.Rect(x - 1, y - 1, text.get_width() + 2, text.get_height() + 2)
-		self.fonts[SPQR.FONT_VERA].set_bold(False)
-
-	def renderUnits(self):
-		for i in SDATA.iterUnits():
-			self.image("buffer").blit(self.image(i.image), SDATA.getUnitPosition(i.name))
+		surface.blit(label, (x - 1 - area.x, y - 1 - area.y))
 
 	# now a function to add a window
 	# it has it's own function because it has to return the index number
@@ -265,12 +353,14 @@ class CGFXEngine(object):
 	
 	def addDirtyRect(self, new, rectangle):
 		"""Routine adds dirty rectangle and details to the current list"""
+		# make sure the screen is up to date before we copy it
+		self.flushRender()
 		# get the old image from the screen
 		img = pygame.Surface((rectangle.w, rectangle.h))
 		img.blit(pygame.display.get_surface(), (0, 0), rectangle)
-		# now blit the new image
+		# now blit the new image, to be shown with the rest of the frame
 		self.screen.blit(new, (rectangle.x, rectangle.y))
-		pygame.display.update(rectangle)
+		self.update_rects.append(pygame.Rect(rectangle))
 		self.dirty.append(CDirtyRect(img, rectangle))
 		return True
 
@@ -281,7 +371,7 @@ class CGFXEngine(object):
 		if len(self.dirty) > 0:
 			# yes, update the screen first
 			self.screen.blit(self.dirty[-1].image, self.dirty[-1].rect)
-			pygame.display.update(self.dirty[-1].rect)
+			self.update_rects.append(pygame.Rect(self.dirty[-1].rect))
 			self.dirty.pop()
 		else:
 			return False
@@ -297,44 +387,102 @@ class CGFXEngine(object):
 	
 	def killTopWindow(self):
 		"""Remove top window. Redraws gui as well"""
-		self.windows.pop()
-		#self.updateGUI()
+		window = self.windows.pop()
+		# only the area under the window needs drawing again
+		self.addGUIDirty(window.rect)
 		return True
 
 	def updateGUI(self):
-		"""Redraws entire screen. Should avoid calling this really and use
-		   dirty rectangles technique. Having said that, it's not actually
-		   that slow either"""
+		"""Redraws entire screen at the end of this frame. Should avoid
+		   calling this really and use dirty rectangles technique. Having
+		   said that, it's not actually that slow either"""
+		self.redraw_gui = True
+		return True
+
+	def drawGUI(self):
+		"""Draw the entire screen, returning a list of the
+		   areas that need to be updated"""
 		# if we have anything in the dirty list, we merely have to update that area
 		# with the new image etc...
 		if len(self.dirty) > 0:
 			self.screen.blit(self.dirty[-1].image, self.dirty[-1].rect)
-			pygame.display.update(self.dirty[-1].rect)
-			return True
-		# before doing anything else, blit the map
-		self.screen.blit(self.image("buffer"), self.map_rect, self.map_screen)
-		index = 0
-		# we have to do the window testing in reverse to the way we blit, as the first
-		# object blitted is on the 'bottom' of the screen, and we have to test from the top
-		for foo in self.windows:
-			if foo.display == True:
-				self.screen.blit(foo.image, (foo.rect.x, foo.rect.y))
-			for bar in foo.items:
-				if bar.visible == True:
+			return [self.dirty[-1].rect]
+		return [self.drawArea(self.screen.get_rect())]
+
+	def coveredBy(self, rect, index):
+		"""Return True if the screen area rect is hidden by one of the
+		   windows above self.windows[index]. Use -1 to test all windows"""
+		for window in self.windows[index + 1:]:
+			if window.display == True and window.rect.contains(rect):
+				return True
+		return False
+
+	def drawArea(self, area):
+		"""Draw the map and the windows over it, but only inside the given
+		   screen area. Windows are drawn bottom to top, but anything that
+		   is completely hidden by a window above it is skipped. Returns
+		   the area drawn"""
+		self.screen.set_clip(area)
+		part = self.map_rect.clip(area)
+		if part.w != 0 and part.h != 0 and self.coveredBy(part, -1) == False:
+			self.map_tiles.draw(self.screen, part,
+				part.move(self.map_screen.x - self.map_rect.x, self.map_screen.y - self.map_rect.y))
+			if part == self.map_rect:
+				self.map_dirty = []
+		for index, window in enumerate(self.windows):
+			if window.rect.colliderect(area) == False:
+				continue
+			hidden = self.coveredBy(window.rect.clip(area), index)
+			if window.display == True and hidden == False:
+				# the window and all it's items are a single image
+				self.screen.blit(window.drawWindow(), window.rect)
+			for item in window.items:
+				dest = item.rect.move(window.rect.x, window.rect.y)
+				if item.visible == True and window.display == False and hidden == False:
 					# is this the mini-map?
-					if bar.describe  ==  "mini-map":
+					if item.describe == "mini-map":
 						# just update it
 						self.updateMiniMap()
-						x1 = foo.rect.x+bar.rect.x
-						y1 = foo.rect.y+bar.rect.y
-						self.screen.blit(bar.image, (x1, y1))
+					self.screen.blit(item.image, dest)
+				if area.contains(dest) == True:
+					# we drew all of it, so it's up to date
+					if item.visible == True:
+						item.drawn = dest
 					else:
-						x1 = foo.rect.x+bar.rect.x
-						y1 = foo.rect.y+bar.rect.y
-						self.screen.blit(bar.image, (x1, y1))
-			index += 1
-		pygame.display.flip()
+						item.drawn = None
+					item.dirty = False
+		self.screen.set_clip(None)
+		return area
+
+	def addGUIDirty(self, rect):
+		"""Draw the given screen area again at the end of this frame"""
+		self.gui_dirty.append(pygame.Rect(rect))
 		return True
+
+	def drawGUIDirty(self):
+		"""Draw every widget that has changed since the last frame, and
+		   any areas added with addGUIDirty(). A widget is drawn where it
+		   was and where it is now, so a highlight or a tooltip costs a
+		   small blit and not a redraw of the screen. Returns the list of
+		   areas drawn, which may be empty"""
+		# can't draw over a window that is in the way
+		if len(self.dirty) > 0:
+			return []
+		rects = self.gui_dirty
+		self.gui_dirty = []
+		for window in self.windows:
+			for item in window.items:
+				if item.dirty == False:
+					continue
+				if item.drawn != None:
+					rects.append(item.drawn)
+				if item.visible == True:
+					rects.append(item.rect.move(window.rect.x, window.rect.y))
+				# so a hidden item that was never drawn is done with
+				item.dirty = False
+		for rect in rects:
+			self.drawArea(rect)
+		return rects
 	
 	def updateOverlayWindow(self):
 		"""Draw the window with the widget overlays only"""
@@ -350,14 +498,19 @@ class CGFXEngine(object):
 	# this one merely updates the map, rather than blit all those
 	# gui things as well
 	def updateMap(self):
-		"""Updates (i.e. redraws) map to main screen"""
-		self.screen.blit(self.image("buffer"), self.map_rect, self.map_screen)
-		self.updateOverlayWindow()
-		pygame.display.flip()
+		"""Updates (i.e. redraws) map to main screen at the end of this frame"""
+		self.redraw_map = True
 		# doing this *always* redraws the units as well, so make sure that
 		# the next flash unit action will be to erase the unit
 		self.unitFlashOn()
 
+	def drawMap(self):
+		"""Draw the map to the screen, and return the area drawn"""
+		self.map_tiles.draw(self.screen, self.map_rect, self.map_screen)
+		self.map_dirty = []
+		self.updateOverlayWindow()
+		return self.map_rect
+
 	# and this one merely blits the cursor in the mini map
 	def updateMiniMap(self):
 		"""Redraws mini-map, usually called after any changes to
@@ -373,12 +526,68 @@ class CGFXEngine(object):
 			pygame.draw.rect(self.map_widget.image, (0, 0, 0), self.blit_rect, 1)
 		return True
 	
+	def drawMapDirty(self):
+		"""Draws only those parts of the map on the screen that have
+		   changed since the last update. Returns a list of the areas
+		   drawn, which may be empty"""
+		# can't draw the map over a window that is in the way
+		if len(self.dirty) > 0:
+			return []
+		# map co-ords to screen co-ords
+		xoff = self.map_rect.x - self.map_screen.x
+		yoff = self.map_rect.y - self.map_screen.y
+		rects = []
+		for rect in self.map_dirty:
+			dest = rect.move(xoff, yoff).clip(self.map_rect)
+			if dest.w == 0 or dest.h == 0:
+				# not on the screen
+				continue
+			rects.append(dest)
+		self.map_dirty = []
+		# draw the map and any windows over these areas
+		for dest in rects:
+			self.drawArea(dest)
+		return rects
+
+	def flushRender(self):
+		"""Draw everything asked for since the last frame, and then show
+		   it all with a single update of the display. Returns False if
+		   there was nothing to draw"""
+		rects = self.update_rects
+		self.update_rects = []
+		if self.pan_x != 0 or self.pan_y != 0:
+			rects.extend(self.scrollMap(self.pan_x, self.pan_y))
+			self.pan_x = 0
+			self.pan_y = 0
+		if self.redraw_gui == True:
+			rects.extend(self.drawGUI())
+		elif self.redraw_map == True:
+			rects.append(self.drawMap())
+		rects.extend(self.drawGUIDirty())
+		rects.extend(self.drawMapDirty())
+		self.redraw_gui = False
+		self.redraw_map = False
+		if rects == []:
+			return False
+		pygame.display.update(rects)
+		self.frames += 1
+		return True
+
+	def endFrame(self, start):
+		"""Called at the end of each pass of the main loop, with the
+		   time in ms that the frame started. Shows the frame and
+		   keeps the frame rate steady"""
+		self.flushRender()
+		self.frame_times.append(pygame.time.get_ticks() - start)
+		if len(self.frame_times) > SPQR.FRAME_HISTORY:
+			self.frame_times.pop(0)
+		self.frame_clock.tick(SPQR.FRAME_FPS)
+
 	def updateUnits(self):
 		"""Unit is to be called when a unit is placed or
 		   removed from the map. Always returns True"""
-		# blit the map_render original across first
-		self.image("buffer").blit(self.map_render, (0, 0))
-		self.updateMap()
+		for i in SDATA.iterRegions():
+			self.addMapDirty(self.unitArea(i))
 		return True
 
 	def centreMap(self, xpos, ypos):
@@ -435,12 +644,17 @@ class CGFXEngine(object):
 	# routine captures what event we got, then passes that message along
 	# to the testing routine (i.e. this code only checks if a MOUSE event
 	# happened, the later function checks if we got a GUI event)
-	def checkInputs(self):
+	def checkInputs(self, event = None):
 		"""checkInputs() is called on a loop whilst the game is waiting
 		   for user input (i.e. most of the time). It doens't actually do
 		   anything with the input except pass the event along to somewhere
-		   else, so think of it more like a sorting office"""
-		event = pygame.event.wait()
+		   else, so think of it more like a sorting office. If no event
+		   is passed, it waits for the next one"""
+		if event == None:
+			event = pygame.event.wait()
+		# panning the map takes all the mouse events it needs
+		if self.panning == True and self.panEvent(event) == True:
+			return True
 		# lets start with the simple case: handling keypress values
 		if event.type == KEYDOWN:
 			return self.handleKeypress(event)
@@ -525,7 +739,7 @@ class CGFXEngine(object):
 						dest = pygame.Rect(bar.rect.x+self.windows[-1].rect.x,
 							bar.rect.y+self.windows[-1].rect.y, bar.rect.w, bar.rect.h)
 						self.screen.blit(bar.pressed, dest)
-						pygame.display.update(dest)
+						self.update_rects.append(dest)
 						return True
 				if bar.highlight == True and bar.wtype == SPQR.WT_BUTTON:
 					# an old highlight needs rubbing out
@@ -533,7 +747,7 @@ class CGFXEngine(object):
 					dest = pygame.Rect(bar.rect.x+self.windows[-1].rect.x,
 						bar.rect.y+self.windows[-1].rect.y, bar.rect.w, bar.rect.h)
 					self.screen.blit(bar.image, dest)
-					pygame.display.update(dest)
+					self.update_rects.append(dest)
 					return True
 		return False
 
@@ -639,24 +853,20 @@ class CGFXEngine(object):
 				self.highlightMoves(unit.name)
 		else:
 			self.unitFlashAndOff()
+		# the widgets changed here are drawn again at the end of the frame
 		name = SDATA.regionClicked(x, y)
 		if name != False:
 			self.renderRegionInfoBox(name)
 			self.renderImageUnits(name)
-			self.updateGUI()
 		else:
 			# clear box if no info
-			if self.info_widget.visible == True:
-				self.info_widget.visible = False
-				self.updateGUI()
+			self.info_widget.visible = False
 		return True
 
 	def moveUnit(self, region):
 		"""Move the unit (or not)"""
 		def cancelMoves(): 
-			self.map_click_moves = []
-			self.renderPixelMap()
-			self.updateMap()
+			self.clearMoves()
 		# there are 2 choices: player clicked no region,
 		# or region not on list: reset map and move on
 		# played clicked region on list: move unit
@@ -666,10 +876,12 @@ class CGFXEngine(object):
 			# delete image from current map
 			old_region = SDATA.getUnitRegion(unit)
 			SDATA.moveUnit(unit, region)
+			self.listRowChanged(unit)
+			self.renderSingleRegion(old_region)
+			self.renderSingleRegion(region)
 			cancelMoves()
 			self.unitFlashAndOff()
 			self.flushFlash()
-			self.renderSingleRegion(old_region)
 			# finally, we should click the map on the new region city
 			# now highlight the new unit if it has moves left, or focus on the city
 			if SDATA.getUnitMoves(unit) != 0:
@@ -686,29 +898,56 @@ class CGFXEngine(object):
 		self.unitFlashAndOff()
 		return False
 
+	def undoMove(self):
+		"""Undo the last move, redrawing just the 2 regions it changed.
+		   Returns False if there was nothing to undo"""
+		return self.showCommand(SDATA.undoMove())
+
+	def redoMove(self):
+		"""As undoMove(), but makes the last undone move again"""
+		return self.showCommand(SDATA.redoMove())
+
+	def showCommand(self, command):
+		"""Update the map after a move was undone or redone"""
+		if command == None:
+			return False
+		# any highlights and flashing are for the old position
+		self.clearMoves()
+		self.unitFlashAndOff()
+		self.flushFlash()
+		self.clearFlash()
+		self.renderSingleRegion(command.start)
+		self.renderSingleRegion(command.end)
+		self.listRowChanged(command.unit)
+		return True
+
+	def listRowChanged(self, id_value):
+		"""Tell every item list that the row with the id value (if they
+		   have one) has changed. Each one only moves that row"""
+		for window in self.windows:
+			for item in window.items:
+				if item.wtype == SPQR.WT_ITEMLIST:
+					item.rowChanged(id_value)
+		return True
+
 	def highlightMoves(self, unit):
-		"""Redraw buffer with highlighted areas and animate the given unit"""
-		# is it navy or army?
-		if SDATA.unitNaval(unit):
-			moves = SDATA.getNavalMoves(SDATA.getUnitRegion(unit))
-		else:
-			# get possible 1 move locations
-			moves = SDATA.getNeighbors(SDATA.getUnitRegion(unit))
+		"""Redraw map with highlighted areas and animate the given unit"""
+		# get all the places it could get to this turn, navy or army
+		moves = SDATA.getUnitRange(unit)
 		# now highlight all of those regions
+		self.map_click_moves = moves
 		for i in moves:
-			name = SDATA.getRegion(i)
-			region = pygame.Surface(self.image(name.image + "_mask").get_size())
-			region.fill(SPQR.COL_WHITE)
-			mask = self.image(name.image + "_mask").copy()
-			mask.blit(region, (0, 0), None, pygame.BLEND_ADD)
-			self.image("buffer").blit(mask, (name.rect.x, name.rect.y))
-			# blit the city, if it exists
-			self.renderSingleCity(name)
+			self.renderSingleRegion(i)
 		# animate the unit
 		self.flash_highlight = unit
 		self.unitFlashOn()
-		self.map_click_moves = moves
-		self.updateMap()
+
+	def clearMoves(self):
+		"""Remove any move highlights from the map"""
+		moves = self.map_click_moves
+		self.map_click_moves = []
+		for i in moves:
+			self.renderSingleRegion(i)
 
 	def focusOnUnit(self, unit):
 		"""Given a units name, centre the map on this unit and activate it"""
@@ -716,12 +955,11 @@ class CGFXEngine(object):
 		x += int(SPQR.UNIT_WIDTH / 2)
 		y += int(SPQR.UNIT_HEIGHT / 2)
 		# we need to clean the map up
-		self.map_click_moves = []
-		self.renderPixelMap()
+		self.clearMoves()
 		self.centreMap(x, y)
+		self.updateMap()
 		# only highlight if we have some moves
 		if SDATA.getUnitMoves(unit) > 0:
-			self.flash_old = None
 			self.highlightMoves(unit)
 
 	# this is the main game loop. There are 2 varients of it, one which keeps
@@ -729,86 +967,131 @@ class CGFXEngine(object):
 	def mainLoop(self):
 		"""CGFXEngine.mainLoop() - call with nothing"""
 		while True:
-			pygame.event.pump()
-			# ok main loop: after setting everything up, just keep calling self.checkInputs()
-			self.checkInputs()
+			self.mainLoopSolo()
 
 	def mainLoopSolo(self):
-		"""As mainLoop, but only for 1 event"""
-		pygame.event.pump()
-		self.checkInputs()
+		"""As mainLoop, but only for 1 frame"""
+		# sleep until something happens...
+		event = pygame.event.wait()
+		start = pygame.time.get_ticks()
+		self.checkInputs(event)
+		# ...then deal with everything else that came in as well
+		for event in pygame.event.get():
+			self.checkInputs(event)
+		self.endFrame(start)
 
 	# this is the function that allows you to pan the the map with the 
 	# middle mouse button
 	def panMap(self):
 		"""CGFXEngine.panMap() - call with nothing
-			 Returns nothing, allows user to pan map with middle click"""
+			 Starts panning the map. The main loop then sends the mouse
+			 events to panEvent() until the middle button is released"""
 		# before doing anything else, turn off unit flashing
 		self.unitFlashAndOff()
-		xpos, ypos = pygame.mouse.get_rel()
-		while True:
-			event = pygame.event.poll()
-			if event.type == MOUSEMOTION:
-				# cancel current action if we got mouse button up
-				a, b, c = pygame.mouse.get_pressed()
-				if b != 1:
-					# mouse has been de-pressed
-					# turn unit animation back on
-					self.unitFlashOn()
-					return
-				# grab relative grabs
-				xpos, ypos = pygame.mouse.get_rel()
-				# update the map thus
-				self.map_screen.x -= xpos
-				self.map_screen.y -= ypos
-				# check the scroll areas...
-				self.normalizeScrollArea()
-				# and then finally draw it!
-				self.updateMiniMap()
-				self.updateMap()
-
-	# routine draws the map we actually render
+		self.panning = True
+
+	def panEvent(self, event):
+		"""Handle an event whilst panning the map. Returns True if the
+		   event was used, False if it should be handled as normal"""
+		if event.type == MOUSEMOTION:
+			# cancel current action if the mouse button is up
+			if event.buttons[1] != 1:
+				self.endPan()
+				return False
+			# all the movement this frame is drawn in a single step
+			self.pan_x -= event.rel[0]
+			self.pan_y -= event.rel[1]
+			return True
+		elif event.type == MOUSEBUTTONUP and event.button == 2:
+			self.endPan()
+			return True
+		return False
+
+	def endPan(self):
+		"""Stop panning the map"""
+		self.panning = False
+		# turn unit animation back on
+		self.unitFlashOn()
+
+	def scrollMap(self, xoff, yoff):
+		"""Scroll the map on the screen by the given amount. The part
+		   of the map still on the screen is moved, and only the areas
+		   uncovered are drawn. Returns a list of the areas to update"""
+		xpos = self.map_screen.x
+		ypos = self.map_screen.y
+		self.map_screen.x += xoff
+		self.map_screen.y += yoff
+		# check the scroll areas...
+		self.normalizeScrollArea()
+		xoff = self.map_screen.x - xpos
+		yoff = self.map_screen.y - ypos
+		if xoff == 0 and yoff == 0:
+			return []
+		self.updateMiniMap()
+		if abs(xoff) >= self.map_rect.w or abs(yoff) >= self.map_rect.h:
+			# nothing on screen we can use
+			return [self.drawMap()]
+		self.screen.set_clip(self.map_rect)
+		self.screen.scroll(-xoff, -yoff)
+		self.screen.set_clip(None)
+		# we need to draw the strips uncovered at the sides...
+		areas = []
+		if xoff > 0:
+			areas.append(pygame.Rect(self.map_rect.right - xoff, self.map_rect.y,
+									 xoff, self.map_rect.h))
+		elif xoff < 0:
+			areas.append(pygame.Rect(self.map_rect.x, self.map_rect.y,
+									 -xoff, self.map_rect.h))
+		if yoff > 0:
+			areas.append(pygame.Rect(self.map_rect.x, self.map_rect.bottom - yoff,
+									 self.map_rect.w, yoff))
+		elif yoff < 0:
+			areas.append(pygame.Rect(self.map_rect.x, self.map_rect.y,
+									 self.map_rect.w, -yoff))
+		# ...and where the overlay widgets got moved to
+		offset = self.windows[-1].rect
+		for i in self.windows[-1].items:
+			if i.visible == True:
+				areas.append(i.rect.move(offset.x - xoff, offset.y - yoff))
+		xpos = self.map_screen.x - self.map_rect.x
+		ypos = self.map_screen.y - self.map_rect.y
+		for dest in areas:
+			dest = dest.clip(self.map_rect)
+			if dest.w != 0 and dest.h != 0:
+				self.map_tiles.draw(self.screen, dest, dest.move(xpos, ypos))
+		self.updateOverlayWindow()
+		return [self.map_rect]
+
+	# routine forces a redraw of the map we actually render
 	def renderPixelMap(self):
-		"""Routine generates map we actually display to the screen,
-		   having rendered cities, units, roads etc.
-		   The current ordering of the blits, from first to last, is:
-		   Back map, Regions""" 
-		# blit the original map across first
-		self.image("buffer").blit(self.image("map"), (0, 0))
-		# start by blitting the regions and units
-		self.renderRegions()
-		self.renderCities()
-		# save this image as it is for now without the images for using
-		# as the backdrop for all unit animations
-		self.map_render.blit(self.image("buffer"), (0, 0))
-		self.renderUnits()
+		"""Routine throws away the rendered map, so that all of it
+		   is drawn again by renderMapArea() as it is displayed"""
+		self.map_tiles.dirtyAll()
+		self.map_dirty = []
 		return True
 
 	def blitCheckbox(self, widget, xpos, ypos):
 		"""Renders a checkbox at the given location
 		   Very simple, just used to isolate gfx drawing out
 		   of the checkbox widget code"""
-		# we need to blit the buffer copy first
-		self.screen.blit(self.image("buffer"),
-						 (xpos + self.map_screen.x,
-						  ypos + self.map_screen.y + self.iHeight("win_tl"),
-						  widget.rect.w, widget.rect.h))
+		# we need to blit the window behind the checkbox first
+		self.screen.blit(widget.parent.image, (xpos, ypos), widget.rect)
 		self.screen.blit(widget.image, (xpos, ypos, 0, 0))		
-		pygame.display.update((xpos, ypos, widget.rect.w, widget.rect.h))
+		self.update_rects.append(pygame.Rect(xpos, ypos, widget.rect.w, widget.rect.h))
 		return True
 		
 	def blitSlider(self, xpos, ypos, width, height, image):
 		"""Renders the slider bar at given position"""
-		# just blit image and update
+		# just blit image, it's shown at the end of the frame
 		self.screen.blit(image, (xpos, ypos, 0, 0))
-		pygame.display.update((xpos, ypos, width, height))
+		self.update_rects.append(pygame.Rect(xpos, ypos, width, height))
 		return True
 		
 	def blitScrollarea(self, xpos, ypos, width, height, image):
 		"""Renders the scrollarea at given position"""
 		# very similar to blitSlider
 		self.screen.blit(image, (xpos, ypos, 0, 0))
-		pygame.display.update((xpos, ypos, width, height))
+		self.update_rects.append(pygame.Rect(xpos, ypos, width, height))
 		return True
 
 	# here follows the timer routines. They mainly deal with unit
@@ -817,13 +1100,10 @@ class CGFXEngine(object):
 		"""Flashes current highlighted unit. Returns True if the screen
 		   was updated, false otherwise"""
 		# this is quite a long, boring, routine so I'll explain all here:
-		# we create here 3 images. One is the sprite ON, and the other OFF, for
-		# animation purposes. To do this, we grab the square area that we are
-		# going to animate from map_render, which doesn't contain any units:
-		# This is the erase render
+		# we create here 2 images. One is the sprite ON, and the other OFF, for
+		# animation purposes. To do this, we render the square area that we are
+		# going to animate without any units: this is the erase render
 		# then we copy that image and add our focus unit: this is the other frame.
-		# third image is used to store the original status of the back map in this
-		# area so that we can restore the original state later
 		# TODO: split this huge routine up
 		# do we need to flash at all?
 		if self.flash_highlight == None:
@@ -834,21 +1114,16 @@ class CGFXEngine(object):
 		# to see if the unit highlight has changed at all
 		if self.flash_highlight != self.current_highlight:
 			self.current_highlight = self.flash_highlight
-			# we now have an new flashing unit. Firstly, remove the old blit area
-			if self.flash_old != None:
-				self.image("buffer").blit(self.flash_old, self.flash_rect)	
+			# we now have an new flashing unit. Firstly, remove the old mark
+			self.markUnit(None)
 			# now we generate the part we use to erase the area.
 			self.flash_erase = pygame.Surface((SPQR.UNIT_WIDTH, SPQR.UNIT_HEIGHT), SRCALPHA)
-			# ok, we can blit the rendered map over
 			# get the x,y co-ords we need
 			x, y = SDATA.getUnitPosition(self.current_highlight)
 			# so we can calculate the blit rectangle
 			self.flash_rect = pygame.Rect(x, y, SPQR.UNIT_WIDTH, SPQR.UNIT_HEIGHT)
-			# use this to copy are from map_render:
-			self.flash_erase.blit(self.map_render, (0, 0), self.flash_rect)
-			# also make a copy of the area to blit back to the back map:
-			self.flash_old = pygame.Surface((SPQR.UNIT_WIDTH, SPQR.UNIT_HEIGHT))
-			self.flash_old.blit(self.image("buffer"), (0, 0), self.flash_rect)
+			# and render the map there, without the units
+			self.renderMapArea(self.flash_erase, self.flash_rect, False)
 			# now we can construct the draw image. Get a copy of the last image
 			self.flash_draw = pygame.Surface((SPQR.UNIT_WIDTH, SPQR.UNIT_HEIGHT), SRCALPHA)
 			self.flash_draw.blit(self.flash_erase, (0, 0))
@@ -862,8 +1137,6 @@ class CGFXEngine(object):
 			
 			# make sure that we draw the erase part of the image first
 			self.flash_on = True
-			# screen map probably needs updating, do it here
-			self.updateMap()
 		
 		# thats it, we have a copy of the draw, erase and clean-up images
 		# since both areas are square and use the same size image, we can
@@ -891,7 +1164,7 @@ class CGFXEngine(object):
 				self.screen.blit(self.flash_draw, dest, area)
 				self.flash_on = True
 			# update the screen and we're done
-			pygame.display.update(dest)
+			self.update_rects.append(dest)
 			return True
 		# the rectangles didn't overlap, but get ready for next round:
 		if self.flash_on == True:
@@ -903,8 +1176,18 @@ class CGFXEngine(object):
 	def clearFlash(self):
 		"""Routine clears any gfx stuff on the map due to flashing"""
 		# really simple code at the moment
-		self.image("buffer").blit(self.flash_old, self.flash_rect)
-		self.updateMap()
+		self.markUnit(None)
+
+	def markUnit(self, unit):
+		"""Draw the unit on the map with it's moves left over it,
+		   and clear this from any other unit. Pass None to just clear"""
+		self.addMapDirty(self.marked_rect)
+		self.unit_marked = unit
+		if unit != None:
+			x, y = SDATA.getUnitPosition(unit)
+			self.marked_rect = pygame.Rect(x, y, SPQR.UNIT_WIDTH, SPQR.UNIT_HEIGHT)
+			self.addMapDirty(self.marked_rect)
+		return True
 
 	def unitFlashAndOff(self):
 		"""Call to turn off unit flashing. Also draws unit back to screen
@@ -915,16 +1198,13 @@ class CGFXEngine(object):
 		# is unit currently on screen?
 		if self.flash_on == False:
 			# no, so update it
-			self.image("buffer").blit(self.flash_draw, self.flash_rect)
-			self.updateMap()
+			self.markUnit(self.current_highlight)
 			self.flash_on = True
-			self.flash_old = None
 		# turn flashing off
 		self.timer = False
 
 	def flushFlash(self):
-		"""Forces a redraw next time we flash, but DON'T draw old map image onto buffer"""
-		self.flash_old = None
+		"""Forces a redraw next time we flash, but DON'T clear the old unit mark"""
 		self.current_highlight = None
 		self.flash_highlight = None
 
@@ -1000,41 +1280,15 @@ class CGFXEngine(object):
 		   to test against, and the font. Returns false if
 		   it couldn't be done, otherwise returns true and
 		   the image is in the gui spare image"""
-		final_lines = []
-		requested_lines = text.splitlines()
-		# Create a series of lines that will fit on the provided rectangle
-		for requested_line in requested_lines:
-			if self.fonts[fnt].size(requested_line)[0] > x:
-				words = requested_line.split(' ')
-				# if any of our words are too long to fit, return.
-				for word in words:
-					if self.fonts[fnt].size(word)[0] >= x:
-						# TODO: should actually handle long words, since a web address
-						# has been found to be too long for this code!
-						# Possible answer: don't use long web addresses, or break them
-						# up first.
-						print "Error: Word was too long in label"
-						return False
-				# Start a new line
-				accumulated_line = ""
-				for word in words:
-					test_line = accumulated_line+word+" "
-					# Build the line while the words fit.
-					if self.fonts[fnt].size(test_line)[0] < x:
-						accumulated_line = test_line
-					else:
-						final_lines.append(accumulated_line)
-						accumulated_line = word+" "
-				final_lines.append(accumulated_line)
-			else:
-				final_lines.append(requested_line)
+		final_lines = STEXT.wrapText(text, self.fonts[fnt], x)
+		if final_lines == None:
+			# TODO: should actually handle long words, since a web address
+			# has been found to be too long for this code!
+			# Possible answer: don't use long web addresses, or break them
+			# up first.
+			return False
 		# everything seemed to work ok.. so far!
-		accumulated_height = 0
-		for line in final_lines:
-			if accumulated_height + self.fonts[fnt].size(line)[1] >= y:
-				return False
-			accumulated_height += self.fonts[fnt].size(line)[1]
-		return True
+		return len(final_lines) * self.fonts[fnt].get_height() < y
 
 	# there are always some standard routines in any gui...here is a messagebox
 	def messagebox(self, flags, text, win_title):
@@ -1051,17 +1305,20 @@ class CGFXEngine(object):
 		# get average size of height..
 		height = (self.fonts[self.msg_font].size("X")[1])+1
 		# really short message? (as long as there are no cr's inside)
-		if self.fonts[self.msg_font].size(text)[0] < txt_width and re.search("\n", text) == False:
+		if STEXT.textWidth(self.fonts[self.msg_font], text) < txt_width and re.search("\n", text) == False:
 			# then don't even bother with a 2nd line...easy
 			# render text to spare image
-			self.temp_image = self.fonts[self.msg_font].render(text, 1, (0, 0, 0))
+			self.temp_image = STEXT.renderLine(text, self.fonts[self.msg_font], (0, 0, 0))
 		else:
-			# we KNOW we can't fit it into one line, try with 2,3,4 etc until it fits
-			done = False
-			ysize = height
-			while done == False:
+			# we KNOW we can't fit it into one line, so wrap it once and
+			# then find the first of 2,3,4 etc lines that holds it
+			lines = STEXT.wrapText(text, self.fonts[self.msg_font], txt_width)
+			if lines == None:
+				return SPQR.BUTTON_FAIL
+			text_height = len(lines) * self.fonts[self.msg_font].get_height()
+			ysize = height * 2
+			while text_height >= ysize:
 				ysize = ysize+height
-				done = self.fitText(text, txt_width, ysize, self.msg_font)
 			height = ysize
 		# now we have the right size, lets render it!
 		# start with a window, but work out the height first...
@@ -0,0 +1,61 @@
+#!/usr/bin/python
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+# routines to run the game with no display and no sound. None of the
+# game data needs the gui, so turns can be played as fast as the data
+# code allows, for testing and benchmarks
+
+import os, random, time
+
+import spqr_data as SDATA
+
+def useDummyDrivers():
+	"""Make SDL use it's dummy video and audio drivers, so that the
+	   gui code can run on a machine with no display or sound card.
+	   Must be called before pygame.init()"""
+	os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+	os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+def simulateTurns(turns, seed = None):
+	"""Play the given number of turns. Every unit uses all of it's
+	   moves, going to random regions. Returns the number of moves made"""
+	random.seed(seed)
+	total = 0
+	for turn in range(turns):
+		# always move the units in the same order, so a seed gives the same game
+		for name in sorted(SDATA.data.map.units.keys()):
+			unit = SDATA.getUnit(name)
+			while unit.moves_left > 0:
+				moves = SDATA.getUnitRange(name)
+				if moves == []:
+					break
+				SDATA.moveUnit(name, random.choice(moves))
+				total += 1
+		SDATA.data.initNewTurn()
+	return total
+
+def runBatch(turns, seed = None):
+	"""Play the given number of turns and print how long it took"""
+	if SDATA.data.map.units == {}:
+		SDATA.addUnits()
+	# we are only timing the game, so don't save it
+	SDATA.data.autosave = 0
+	start = time.time()
+	moves = simulateTurns(turns, seed)
+	seconds = time.time() - start
+	print "[SPQR]: Played", turns, "turns,", moves, "moves in", "%.3f" % seconds, "seconds"
+	return True
+
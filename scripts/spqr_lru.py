@@ -0,0 +1,56 @@
+#!/usr/bin/python
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+from collections import OrderedDict
+
+class CLRUCache(object):
+	"""Holds up to size values by key. When full, the value that has
+	   gone unused for longest is thrown away to make room"""
+	def __init__(self, size):
+		self.size = size
+		# least recently used first
+		self.values = OrderedDict()
+		self.hits = 0
+		self.misses = 0
+
+	def get(self, key, default = None):
+		"""Return the value for key, or default if we don't have it"""
+		value = self.values.pop(key, self)
+		if value is self:
+			self.misses += 1
+			return default
+		# put it back at the end, as the latest used
+		self.values[key] = value
+		self.hits += 1
+		return value
+
+	def put(self, key, value):
+		"""Store the value, making room if we need to"""
+		self.values.pop(key, None)
+		while len(self.values) >= self.size:
+			self.values.popitem(False)
+		self.values[key] = value
+		return value
+
+	def clear(self):
+		self.values.clear()
+
+	def __len__(self):
+		return len(self.values)
+
+	def __contains__(self, key):
+		return key in self.values
+
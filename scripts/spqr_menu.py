@@ -89,12 +89,16 @@ class CMenu(object):
 	def __init__(self, children):
 		self.active = True
 		self.visible = True
+		# the menu draws itself straight to the screen, so the gui
+		# never has to draw it again because it changed
+		self.dirty = False
+		self.drawn = None
 		self.wtype = SPQR.WT_MENU
 		self.parents = []
 		# children is an array of arrays, with a one-on-one
 		self.menu = children
 		# load the base image we will use to generate the titlebar gfx
-		titlebar = pygame.image.load(os.path.normpath("../gfx/gui/titlebar.png")).convert()
+		titlebar = pygame.image.load(os.path.normpath(SPQR.GFX_F + "/gui/titlebar.png")).convert()
 		# store the rect for later
 		self.rect = pygame.Rect(0,0,SPQR.SCREEN_WIDTH,titlebar.get_height())
 		# draw the top bar starting here
@@ -109,7 +113,7 @@ class CMenu(object):
 			self.image.blit(titlebar, dest)
 			dest.x += 8
 		# blit the rhs
-		titlebar = pygame.image.load(os.path.normpath("../gfx/gui/titlebar_fill.png")).convert()
+		titlebar = pygame.image.load(os.path.normpath(SPQR.GFX_F + "/gui/titlebar_fill.png")).convert()
 		dest.x = SPQR.SCREEN_WIDTH - (rhs_txt_width + 56)
 		while dest.x < SPQR.SCREEN_WIDTH:
 			self.image.blit(titlebar,dest)
@@ -0,0 +1,223 @@
+#!/usr/bin/python
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+# recording and replaying games. A recording is a saved game, and then a
+# log of everything that changed the game after that: units moving, units
+# being added, moves being undone or redone and new turns. Playing the
+# log back on the saved game gives the same game again, with no display
+# needed.
+
+# The log is a line saying what it is and the version, and then records.
+# Each record is a 1 byte code and then it's values, packed with struct.
+# Strings are only written once, as a STRING record, and after that are
+# referred to by number (the first string is 0, the next 1 and so on)
+
+import os, struct, time
+
+import spqr_defines as SPQR
+import spqr_data as SDATA
+import spqr_save as SSAVE
+import units.spqr_unit as SUNITS
+
+LOG_STRING = 0
+LOG_MOVE = 1
+LOG_ADD_UNIT = 2
+LOG_NEW_TURN = 3
+LOG_UNDO = 4
+LOG_REDO = 5
+
+RECORD_STRING = struct.Struct("<BH")
+RECORD_MOVE = struct.Struct("<BII")
+RECORD_ADD_UNIT = struct.Struct("<BIIIBB")
+RECORD_NEW_TURN = struct.Struct("<B")
+# undo and redo are just the code as well
+RECORD_CODE = struct.Struct("<B")
+
+def magic():
+	return "SPQR-REPLAY " + str(SPQR.REPLAY_VERSION) + "\n"
+
+def replayName(extension):
+	return os.path.join(SPQR.SAVE_F, SPQR.REPLAY_FILE + extension)
+
+class CReplayLog(object):
+	"""Writes the log of a game. Records are only ever added to the end.
+	   The file is flushed every turn, so a crash loses one turn at most.
+	   savefile is the game the log starts from"""
+	def __init__(self, filename, savefile):
+		self.filename = filename
+		self.savefile = savefile
+		self.logfile = open(filename, "wb")
+		self.logfile.write(magic())
+		self.strings = {}
+		self.commands = 0
+
+	def string(self, text):
+		"""Return the number of the string, writing it first if needed"""
+		number = self.strings.get(text)
+		if number == None:
+			number = len(self.strings)
+			self.strings[text] = number
+			self.logfile.write(RECORD_STRING.pack(LOG_STRING, len(text)))
+			self.logfile.write(text)
+		return number
+
+	def moveUnit(self, unit, region):
+		self.logfile.write(RECORD_MOVE.pack(LOG_MOVE, self.string(unit), self.string(region)))
+		self.commands += 1
+
+	def addUnit(self, region, unit):
+		self.logfile.write(RECORD_ADD_UNIT.pack(LOG_ADD_UNIT, self.string(unit.name),
+			self.string(unit.image), self.string(region), unit.moves, int(unit.naval)))
+		self.commands += 1
+
+	def undoMove(self):
+		self.logfile.write(RECORD_CODE.pack(LOG_UNDO))
+		self.commands += 1
+
+	def redoMove(self):
+		self.logfile.write(RECORD_CODE.pack(LOG_REDO))
+		self.commands += 1
+
+	def newTurn(self):
+		self.logfile.write(RECORD_NEW_TURN.pack(LOG_NEW_TURN))
+		self.logfile.flush()
+		self.commands += 1
+
+	def close(self):
+		self.logfile.close()
+
+def record(info, savefile = None, logfile = None):
+	"""Save the game in info and start logging everything that happens
+	   to it after. Returns False if the game could not be saved"""
+	if savefile == None:
+		savefile = replayName(".sav")
+	if logfile == None:
+		logfile = replayName(".log")
+	stop(info)
+	if SSAVE.save(info, savefile, True) == False:
+		return False
+	info.map.log = CReplayLog(logfile, savefile)
+	return True
+
+def load(filename, info):
+	"""Load the saved game into info, as SSAVE.load() does. If the game
+	   was being recorded, the old recording is no use now, so a new one
+	   is started from the loaded game. Returns False if the game could
+	   not be loaded"""
+	log = info.map.log
+	if SSAVE.load(filename, info) == False:
+		return False
+	if log != None and record(info, log.savefile, log.filename) == False:
+		# the game still loaded, it just isn't being recorded
+		print "[SPQR]: Error: Could not record the loaded game"
+	return True
+
+def stop(info):
+	"""Stop logging the game in info"""
+	if info.map.log != None:
+		info.map.log.close()
+		info.map.log = None
+
+def replay(savefile = None, logfile = None, turns = None):
+	"""Load the saved game and play the log on it, with no display. If
+	   turns is given, stop after that many turns. The game becomes the
+	   current one (SDATA.data). Returns the number of commands done, or
+	   None if the save or log could not be read or a command failed, as
+	   then the game is no longer the one that was recorded"""
+	if savefile == None:
+		savefile = replayName(".sav")
+	if logfile == None:
+		logfile = replayName(".log")
+	info = SDATA.CInfo()
+	# we don't want to save or log what we are doing
+	info.autosave = 0
+	if SSAVE.load(savefile, info) == False:
+		return None
+	try:
+		data = open(logfile, "rb").read()
+	except IOError:
+		return None
+	if data[:len(magic())] != magic():
+		return None
+	SDATA.data = info
+	strings = []
+	commands = 0
+	offset = len(magic())
+	size = len(data)
+	# a crash may leave half a record at the end, so we check there is
+	# a whole record before we do it
+	while offset < size:
+		code = ord(data[offset])
+		if code == LOG_MOVE:
+			if offset + RECORD_MOVE.size > size:
+				break
+			code, unit, region = RECORD_MOVE.unpack_from(data, offset)
+			offset += RECORD_MOVE.size
+			result = SDATA.moveUnit(strings[unit], strings[region])
+		elif code == LOG_STRING:
+			if offset + RECORD_STRING.size > size:
+				break
+			length = RECORD_STRING.unpack_from(data, offset)[1]
+			if offset + RECORD_STRING.size + length > size:
+				break
+			offset += RECORD_STRING.size
+			strings.append(data[offset:offset + length])
+			offset += length
+			continue
+		elif code == LOG_ADD_UNIT:
+			if offset + RECORD_ADD_UNIT.size > size:
+				break
+			code, name, image, region, moves, naval = RECORD_ADD_UNIT.unpack_from(data, offset)
+			offset += RECORD_ADD_UNIT.size
+			unit = SUNITS.CUnit(strings[name], strings[image], moves, naval = (naval == 1),
+								store = info.map.store)
+			result = info.map.addUnit(strings[region], unit)
+		elif code == LOG_UNDO:
+			offset += RECORD_CODE.size
+			result = SDATA.undoMove()
+		elif code == LOG_REDO:
+			offset += RECORD_CODE.size
+			result = SDATA.redoMove()
+		elif code == LOG_NEW_TURN:
+			offset += RECORD_NEW_TURN.size
+			result = True
+			info.initNewTurn()
+			if turns != None:
+				turns -= 1
+				if turns == 0:
+					commands += 1
+					break
+		else:
+			print "Error: Unknown command", code, "in replay log"
+			return None
+		if result == False or result == None:
+			print "Error: Command", commands, "in replay log could not be done"
+			return None
+		commands += 1
+	return commands
+
+def runReplay():
+	"""Play back the last recording and print how long it took"""
+	start = time.time()
+	commands = replay()
+	seconds = time.time() - start
+	if commands == None:
+		print "[SPQR]: Error: Could not read the recorded game"
+		return False
+	print "[SPQR]: Replayed", commands, "commands in", "%.3f" % seconds, "seconds,",
+	print "now in year", SDATA.data.year
+	return True
+
@@ -0,0 +1,276 @@
+#!/usr/bin/python
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+# saving and loading games. A save file is a line saying what it is and
+# the version, then a header of the year, the treasury, the turn and the
+# number of regions and units. Then for every region it's name and the values of
+# it's city, and then every unit, in the order they are in their region.
+# All numbers are packed with struct, and strings are a 2 byte length
+# followed by the string itself.
+
+# Saving is done in 2 parts. First a snapshot is taken, which copies
+# nothing: the city and unit arrays are shared with it, and the game only
+# copies an array when it next changes it. Then the snapshot is written
+# out record by record on another thread, so the game can carry on
+
+import os, struct, threading
+
+import spqr_defines as SPQR
+import units.spqr_unit as SUNITS
+from maps.spqr_economy import COLUMNS
+
+HEADER = struct.Struct("<qqIII")
+CITY = struct.Struct("<" + ("q" * len(COLUMNS)))
+UNIT = struct.Struct("<HhhBiii")
+STRING = struct.Struct("<H")
+
+# bits in the flags of a unit
+UNIT_NAVAL = 1
+UNIT_DONE = 2
+UNIT_STATS = 4
+
+def saveName(name = SPQR.SAVE_FILE):
+	return os.path.join(SPQR.SAVE_F, name)
+
+def autosaveName(slot):
+	return os.path.join(SPQR.SAVE_F, "autosave_" + str(slot) + ".sav")
+
+def magic():
+	return "SPQR-SAVE " + str(SPQR.SAVE_VERSION) + "\n"
+
+class CSnapshot(object):
+	"""The state of the game at the time it was made. The city and unit
+	   arrays are shared with the game until it changes them"""
+	def __init__(self, info):
+		self.year = info.year
+		self.treasury = info.treasury
+		self.turn = info.turn
+		world = info.map
+		self.regions = world.region_names[1:]
+		self.city_rows = [world.regions[i].city.row for i in self.regions]
+		self.cities = world.economy.snapshot()
+		# the units themselves never change their store or row, so we
+		# only need the list of them and a frozen copy of each store
+		self.units = world.units.values()
+		self.stores = {}
+		for key, store in world.unit_stores.iteritems():
+			self.stores[key] = store.freeze()
+
+def writeString(outfile, string):
+	outfile.write(STRING.pack(len(string)))
+	outfile.write(string)
+
+def writeSnapshot(snapshot, filename):
+	"""Write the snapshot to the file. Returns False if we can't"""
+	try:
+		folder = os.path.dirname(filename)
+		if folder != "" and not os.path.isdir(folder):
+			os.makedirs(folder)
+		# write to a temp file first, so a crash never leaves half a save
+		outfile = open(filename + ".tmp", "wb")
+		outfile.write(magic())
+		outfile.write(HEADER.pack(snapshot.year, snapshot.treasury, snapshot.turn,
+								  len(snapshot.regions), len(snapshot.units)))
+		columns = [snapshot.cities[i] for i in COLUMNS]
+		for index, name in enumerate(snapshot.regions):
+			writeString(outfile, name)
+			row = snapshot.city_rows[index]
+			outfile.write(CITY.pack(*[int(i[row]) for i in columns]))
+		# units go in the order they were made in, so they load in the
+		# same order in each region
+		regions = dict([[name, index] for index, name in enumerate(snapshot.regions)])
+		units = [(id(i.store), i.row) for i in snapshot.units]
+		units.sort()
+		for key, row in units:
+			store = snapshot.stores[key]
+			flags = 0
+			if store.naval[row] == 1:
+				flags |= UNIT_NAVAL
+			if store.turn_done[row] == 1:
+				flags |= UNIT_DONE
+			if store.has_stats[row] == 1:
+				flags |= UNIT_STATS
+			writeString(outfile, store.names[row])
+			writeString(outfile, store.images[row])
+			outfile.write(UNIT.pack(regions[store.region_names[store.region[row]]],
+									store.moves[row], store.moves_left[row], flags,
+									store.strength[row], store.quality[row], store.morale[row]))
+		outfile.close()
+		if os.path.exists(filename):
+			os.remove(filename)
+		os.rename(filename + ".tmp", filename)
+	except (IOError, OSError):
+		return False
+	return True
+
+class CSaveThread(threading.Thread):
+	"""Writes a snapshot on it's own thread. When the thread has
+	   finished, result is True if the game was saved"""
+	def __init__(self, snapshot, filename):
+		threading.Thread.__init__(self)
+		self.daemon = True
+		self.snapshot = snapshot
+		self.filename = filename
+		self.result = None
+
+	def run(self):
+		try:
+			self.result = writeSnapshot(self.snapshot, self.filename)
+		except Exception, error:
+			# anything else going wrong must still give a result, or
+			# whoever is waiting would think we were still saving
+			print "Error:", error
+			self.result = False
+		if self.result == False:
+			print "Error: Could not save game to", self.filename
+
+# the last save started, so we can wait for it
+writer = None
+
+def save(info, filename = None, wait = False):
+	"""Save the game in info. The snapshot is taken now, but written on
+	   another thread. Returns the thread, or if wait is True the result"""
+	global writer
+	if filename == None:
+		filename = saveName()
+	# never have 2 threads writing the same file
+	waitForSave()
+	writer = CSaveThread(CSnapshot(info), filename)
+	writer.start()
+	if wait == True:
+		writer.join()
+		return writer.result
+	return writer
+
+def autosave(info, slot):
+	"""Save the game into the given autosave slot. If the last save has
+	   not finished, we skip this one rather than wait for it. Returns
+	   False if we skipped it"""
+	if writer != None and writer.is_alive():
+		print "Warning: Skipped autosave, still saving the last game"
+		return False
+	save(info, autosaveName(slot))
+	return True
+
+def latestSave():
+	"""Return the name of the newest saved game, or None"""
+	names = [saveName()]
+	for slot in range(SPQR.AUTOSAVE_SLOTS):
+		names.append(autosaveName(slot))
+	names = [i for i in names if os.path.exists(i)]
+	if names == []:
+		return None
+	return max(names, key = os.path.getmtime)
+
+def waitForSave():
+	"""Wait for the last save to finish. Returns it's result, or
+	   None if there was no save"""
+	if writer == None:
+		return None
+	writer.join()
+	return writer.result
+
+def readString(data, offset):
+	"""Return the string at offset in data, and the offset after it"""
+	size = STRING.unpack_from(data, offset)[0]
+	offset += STRING.size
+	return data[offset:offset + size], offset + size
+
+def checkUnits(data, offset, count, regions):
+	"""Check that all the units are in the data, that their names are
+	   all different, and that they are in one of the regions (of which
+	   there are the given number) with no region holding more than
+	   SPQR.MAX_STACKING. Returns True if so"""
+	names = set()
+	stacks = [0] * regions
+	for i in range(count):
+		name, offset = readString(data, offset)
+		if name in names:
+			return False
+		names.add(name)
+		offset += STRING.size + STRING.unpack_from(data, offset)[0]
+		region = UNIT.unpack_from(data, offset)[0]
+		if region >= regions or stacks[region] == SPQR.MAX_STACKING:
+			return False
+		stacks[region] += 1
+		offset += UNIT.size
+	return True
+
+def load(filename, info):
+	"""Load the saved game into info, which must use the same map.
+	   Returns False if the file could not be loaded, in which case
+	   info is not changed"""
+	try:
+		data = open(filename, "rb").read()
+	except IOError:
+		return False
+	if data[:len(magic())] != magic():
+		return False
+	world = info.map
+	try:
+		offset = len(magic())
+		year, treasury, turn, region_count, unit_count = HEADER.unpack_from(data, offset)
+		offset += HEADER.size
+		# read the regions first, so we know they all exist in this map
+		regions = []
+		for i in range(region_count):
+			name, offset = readString(data, offset)
+			if name not in world.regions:
+				return False
+			regions.append((name, CITY.unpack_from(data, offset)))
+			offset += CITY.size
+		if checkUnits(data, offset, unit_count, region_count) == False:
+			return False
+	except struct.error:
+		# the file is too short
+		return False
+	# the file is ok, so now we can change the game. The moves that
+	# could be undone were made in the old game
+	info.clearUndo()
+	# any log was of the old game, and would get the units being
+	# removed and added again wrong. SREPLAY.load() starts a new one
+	if world.log != None:
+		world.log.close()
+		world.log = None
+	info.year = year
+	info.treasury = treasury
+	info.turn = turn
+	for name, values in regions:
+		city = world.regions[name].city
+		for column, value in zip(COLUMNS, values):
+			setattr(city, column, value)
+	for name in world.units.keys():
+		world.removeUnit(name)
+	# a new store, so the rows of the old units are not kept. No unit is
+	# in the old stores now, so they don't need saving either
+	store = SUNITS.CUnitStore()
+	world.store = store
+	world.unit_stores = {}
+	for i in range(unit_count):
+		name, offset = readString(data, offset)
+		image, offset = readString(data, offset)
+		region, moves, moves_left, flags, strength, quality, morale = UNIT.unpack_from(data, offset)
+		offset += UNIT.size
+		unit = SUNITS.CUnit(name, image, moves, naval = (flags & UNIT_NAVAL) != 0, store = store)
+		unit.moves_left = moves_left
+		unit.turn_done = (flags & UNIT_DONE) != 0
+		if flags & UNIT_STATS:
+			unit.stats = SUNITS.unitStats(strength, quality, morale)
+		# checkUnits() made sure this works
+		world.addUnit(regions[region][0], unit)
+	world.paths.invalidate()
+	return True
+
@@ -0,0 +1,147 @@
+#!/usr/bin/python
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+# the map and units are written in YAML, which is slow to parse. Here we
+# compile each file into a simple cache that loads much faster, and only
+# compile it again when the file changes.
+
+# A cache file is a line saying what it is and the version, then a pickled
+# header describing the source file, and then the pickled data itself.
+# The map data is a dict holding:
+#   regions: a list of (name, xpos, ypos, colour, unit_pos, city, borders, naval,
+#            move_cost) where borders and naval are lists of region names
+#   edges:   a list of (a, b) borders, as indexes into the region list
+# The unit data is a list of (name, location, image, naval)
+
+import os, hashlib, cPickle, yaml
+
+import spqr_defines as SPQR
+
+# the C yaml loader is much quicker, if we have it
+Loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+def cacheName(filename):
+	"""Return the name of the cache file for the given source file"""
+	path = os.path.abspath(filename)
+	tag = hashlib.md5(path).hexdigest()[:8]
+	return os.path.join(SPQR.CACHE_F, os.path.basename(path) + "-" + tag + ".cache")
+
+def fileHash(filename):
+	return hashlib.md5(open(filename, "rb").read()).hexdigest()
+
+def compileMap(filename):
+	"""Read the map YAML file and return it as map data"""
+	var = yaml.load(open(filename), Loader = Loader)
+	regions = []
+	names = {}
+	for i in var:
+		borders = [j["name"] for j in i["borders"]]
+		naval = [j["name"] for j in i.get("naval", [])]
+		names[i["name"]] = len(regions)
+		regions.append((i["name"], i["xpos"], i["ypos"],
+						(i["colour_r"], i["colour_g"], i["colour_b"]),
+						(i["unit_x"], i["unit_y"]), i["city"], borders, naval,
+						i.get("move_cost", 1)))
+	# the graph is not directed, so each border is only needed once
+	edges = []
+	found = set()
+	for region in regions:
+		start = names[region[0]]
+		for border in region[6]:
+			edge = (start, names[border])
+			if edge in found or (edge[1], edge[0]) in found:
+				continue
+			found.add(edge)
+			edges.append(edge)
+	return {"regions":regions, "edges":edges}
+
+def compileUnits(filename):
+	"""Read the units YAML file and return it as unit data"""
+	var = yaml.load(open(filename), Loader = Loader)
+	return [(i["name"], i["location"], i["image"], i.get("naval", False)) for i in var]
+
+def readCache(cache, source):
+	"""Return the data in the cache file if it is valid for the
+	   source file, or None if it isn't"""
+	try:
+		infile = open(cache, "rb")
+		if infile.readline() != "SPQR-SCENARIO " + str(SPQR.SCENARIO_VERSION) + "\n":
+			return None
+		header = cPickle.load(infile)
+		data = infile.read()
+		data_md5 = header["data_md5"]
+		mtime = header["mtime"]
+		size = header["size"]
+		source_md5 = header["source_md5"]
+	except Exception:
+		# a broken header can fail in any number of ways, but it's
+		# only a cache, so we just compile the source again
+		return None
+	if hashlib.md5(data).hexdigest() != data_md5:
+		# the cache itself is broken
+		return None
+	stats = os.stat(source)
+	if stats.st_mtime == mtime and stats.st_size == size:
+		return cPickle.loads(data)
+	# the file has been touched, but has it really changed?
+	if fileHash(source) != source_md5:
+		return None
+	# no, so update the cache to save checking next time
+	data = cPickle.loads(data)
+	writeCache(cache, source, data)
+	return data
+
+def writeCache(cache, source, data):
+	"""Save the data in the cache file. Returns False if we can't.
+	   This is not an error, we just have to compile every time"""
+	data = cPickle.dumps(data, cPickle.HIGHEST_PROTOCOL)
+	stats = os.stat(source)
+	header = {"mtime":stats.st_mtime,
+			  "size":stats.st_size,
+			  "source_md5":fileHash(source),
+			  "data_md5":hashlib.md5(data).hexdigest()}
+	try:
+		if not os.path.isdir(SPQR.CACHE_F):
+			os.makedirs(SPQR.CACHE_F)
+		# write to a temp file first, so we never leave half a cache behind
+		outfile = open(cache + ".tmp", "wb")
+		outfile.write("SPQR-SCENARIO " + str(SPQR.SCENARIO_VERSION) + "\n")
+		cPickle.dump(header, outfile, cPickle.HIGHEST_PROTOCOL)
+		outfile.write(data)
+		outfile.close()
+		if os.path.exists(cache):
+			os.remove(cache)
+		os.rename(cache + ".tmp", cache)
+	except (IOError, OSError):
+		return False
+	return True
+
+def load(filename, compiler):
+	"""Return the data for the source file, from the cache if we can
+	   or by using the compiler routine (and then caching it) if not"""
+	cache = cacheName(filename)
+	data = readCache(cache, filename)
+	if data == None:
+		data = compiler(filename)
+		writeCache(cache, filename, data)
+	return data
+
+def loadMap(filename):
+	return load(filename, compileMap)
+
+def loadUnits(filename):
+	return load(filename, compileUnits)
+
@@ -31,17 +31,32 @@ class CSound(object):
 		self.volume = SPQR.INIT_VOLUME
 		# initially the music is OFF
 		self.music_playing = False
-		# init all the sound stuff
-		# give myself a large buffer, as well (last value), otherwise playback stutters
-		pygame.mixer.init(44100, -16, True, 4096)
+		# the mixer is not started until the gui needs it
+		self.mixer = False
+
+	def initMixer(self):
+		"""Init all the sound stuff. Returns False if there is no
+		   sound available, in which case SPQR just stays silent"""
+		if self.mixer == True:
+			return True
+		try:
+			# give myself a large buffer, as well (last value), otherwise playback stutters
+			pygame.mixer.init(44100, -16, True, 4096)
+		except pygame.error, message:
+			print "[SPQR]: No sound available:", message
+			return False
+		self.mixer = True
+		return True
 
 	def startNextSong(self):
 		"""Shuffles songs around, then starts playing the next one"""
+		if self.mixer == False:
+			return False
 		# turn of song events...
 		pygame.mixer.music.set_endevent()
 		songtitle = self.music.pop()
 		self.music.insert(0, songtitle)
-		pygame.mixer.music.load("../music/" + songtitle)
+		pygame.mixer.music.load(SPQR.MUSIC_F + "/" + songtitle)
 		# when new music is loaded, the volume param is reset. Fix it
 		pygame.mixer.music.set_volume((float)((float)(self.volume) / 100.0))
 		pygame.mixer.music.play()
@@ -59,6 +74,8 @@ class CSound(object):
 			self.volume = 100
 		else:
 			self.volume = new_volume
+		if self.mixer == False:
+			return False
 		pygame.mixer.music.set_volume((float)((float)(self.volume) / 100.0))
 		return True
 	
@@ -68,6 +85,8 @@ class CSound(object):
 	
 	def stopMusic(self):
 		"""Simply stops the current music"""
+		if self.mixer == False:
+			return False
 		# turn off events as well
 		pygame.mixer.music.set_endevent()
 		pygame.mixer.music.pause()
@@ -76,6 +95,8 @@ class CSound(object):
 		
 	def startMusic(self):
 		"""Turns music back on"""
+		if self.mixer == False:
+			return False
 		pygame.mixer.music.set_endevent(SPQR.EVENT_SONGEND)
 		pygame.mixer.music.unpause()
 		self.music_playing = True
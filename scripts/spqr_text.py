@@ -0,0 +1,99 @@
+#!/usr/bin/python
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+# laying out and drawing text. Every word is only measured once for each
+# font, and after that the width of a line is just adding up it's words,
+# so wrapping text is a single pass over the words. Rendered lines are
+# kept as well, since the same text tends to be drawn again and again
+
+import spqr_defines as SPQR
+import spqr_lru as SLRU
+
+# the width of each word, in a dict for each font (and bold or not)
+widths = {}
+# rendered lines of text, by (text, font, colour)
+lines = SLRU.CLRUCache(SPQR.TEXT_CACHE)
+
+def fontWidths(font):
+	"""Return the dict of word widths for the font"""
+	key = (font, font.get_bold())
+	words = widths.get(key)
+	if words == None:
+		words = {}
+		widths[key] = words
+	return words
+
+def wordWidth(font, word):
+	"""Return the width in pixels of a single word in the font"""
+	words = fontWidths(font)
+	width = words.get(word)
+	if width == None:
+		width = font.size(word)[0]
+		words[word] = width
+	return width
+
+def textWidth(font, text):
+	"""Return the width in pixels of a line of text in the font"""
+	if " " not in text:
+		return wordWidth(font, text)
+	words = text.split(" ")
+	width = wordWidth(font, " ") * (len(words) - 1)
+	for word in words:
+		width += wordWidth(font, word)
+	return width
+
+def wrapText(text, font, width):
+	"""Split the text into lines no wider than width pixels, breaking
+	   at spaces and at any newlines. Returns the list of lines, or None
+	   if there was a word that was too long to fit at all"""
+	space = wordWidth(font, " ")
+	final_lines = []
+	for requested_line in text.splitlines():
+		line = []
+		line_width = 0
+		for word in requested_line.split(" "):
+			size = wordWidth(font, word)
+			if size >= width:
+				print "Error: Word (", word, ") was too long to fit"
+				print "       Width was more than ", width
+				return None
+			if line == []:
+				line = [word]
+				line_width = size
+			elif line_width + space + size < width:
+				line.append(word)
+				line_width += space + size
+			else:
+				final_lines.append(" ".join(line))
+				line = [word]
+				line_width = size
+		final_lines.append(" ".join(line))
+	return final_lines
+
+def renderLine(text, font, colour):
+	"""Return an image of the text, antialiased. The image may be given
+	   to other callers as well, so copy it before drawing on it"""
+	# colours are often lists, which can't be part of a key
+	key = (text, font, font.get_bold(), tuple(colour))
+	image = lines.get(key)
+	if image == None:
+		image = lines.put(key, font.render(text, True, colour))
+	return image
+
+def clear():
+	"""Forget all the sizes and images, for when the fonts change"""
+	widths.clear()
+	lines.clear()
@@ -0,0 +1,96 @@
+#!/usr/bin/python
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+import pygame
+from collections import OrderedDict
+
+import spqr_defines as SPQR
+
+# the rendered map is held as a set of square tiles. A tile is only drawn
+# when some part of it is actually displayed, and is then kept until
+# something drawn on it changes, or until it has not been looked at for
+# a while and we need the memory back
+
+class CMapTiles(object):
+	"""Call with the size of the map, and the routine that draws
+	   the map. This routine is called as render(surface, rect),
+	   and must draw the area rect of the map onto surface"""
+	def __init__(self, width, height, render,
+				 size = SPQR.MAP_TILE_SIZE, limit = SPQR.MAP_TILE_CACHE):
+		self.width = width
+		self.height = height
+		self.render = render
+		self.size = size
+		self.limit = limit
+		# the rendered tiles, the least recently used are first
+		self.tiles = OrderedDict()
+
+	def tileRect(self, tx, ty):
+		"""Return the area of the map covered by tile tx,ty"""
+		rect = pygame.Rect(tx * self.size, ty * self.size, self.size, self.size)
+		return rect.clip(pygame.Rect(0, 0, self.width, self.height))
+
+	def tilesIn(self, rect):
+		"""Return a list of the tiles that the map area rect touches"""
+		rect = rect.clip(pygame.Rect(0, 0, self.width, self.height))
+		if rect.w == 0 or rect.h == 0:
+			return []
+		tiles = []
+		for ty in range(rect.top // self.size, ((rect.bottom - 1) // self.size) + 1):
+			for tx in range(rect.left // self.size, ((rect.right - 1) // self.size) + 1):
+				tiles.append((tx, ty))
+		return tiles
+
+	def getTile(self, tx, ty):
+		"""Return the image of tile tx,ty, drawing it if needed"""
+		tile = self.tiles.pop((tx, ty), None)
+		if tile == None:
+			rect = self.tileRect(tx, ty)
+			tile = pygame.Surface((rect.w, rect.h)).convert()
+			self.render(tile, rect)
+			# make room if we have too many
+			while len(self.tiles) >= self.limit:
+				self.tiles.popitem(False)
+		# always put back at the end, as it's the latest one used
+		self.tiles[(tx, ty)] = tile
+		return tile
+
+	def dirty(self, rect):
+		"""Call when the area rect of the map has changed. Only that
+		   part of any tile we hold is drawn again"""
+		rect = pygame.Rect(rect)
+		for tile in self.tilesIn(rect):
+			if tile in self.tiles:
+				area = self.tileRect(tile[0], tile[1])
+				part = area.clip(rect)
+				self.render(self.tiles[tile].subsurface(part.move(-area.x, -area.y)), part)
+
+	def dirtyAll(self):
+		"""Call when the whole map has changed"""
+		self.tiles.clear()
+
+	def draw(self, surface, dest, area):
+		"""Blit the area of the map onto surface at dest, in the
+		   same way that surface.blit(map, dest, area) would"""
+		area = pygame.Rect(area)
+		for tx, ty in self.tilesIn(area):
+			rect = self.tileRect(tx, ty)
+			part = rect.clip(area)
+			surface.blit(self.getTile(tx, ty),
+						 (dest[0] + part.x - area.x, dest[1] + part.y - area.y),
+						 part.move(-rect.x, -rect.y))
+		return True
+
@@ -16,11 +16,14 @@
 
 import pygame
 from pygame.locals import *
+from functools import cmp_to_key
 
 import spqr_defines as SPQR
 import spqr_events as SEVENT
 import spqr_keys as SKEY
 import spqr_gui as SGFX
+import spqr_text as STEXT
+import spqr_lru as SLRU
 
 # what follows is the base class used for the callback functions of the widgets. Every
 # widget has one, and you can modify the widgets be pointing mouse_* to different functions
@@ -56,6 +59,43 @@ class CWidget(object):
 		# if a widget needs to store state information, it goes here
 		self.data = None
 		self.describe = describe
+		# where the widget was last drawn on the screen, or None
+		self.drawn = None
+
+	# changing the image or visible marks the widget as dirty, so it is
+	# drawn again at the end of the frame. The window it is in also knows
+	# that it has to build it's image again
+	def getImage(self):
+		return self._image
+
+	def setImage(self, image):
+		self._image = image
+		self.markDirty()
+
+	image = property(getImage, setImage)
+
+	def getVisible(self):
+		return self._visible
+
+	def setVisible(self, visible):
+		if getattr(self, "_visible", None) != visible:
+			self._visible = visible
+			self.markDirty()
+
+	visible = property(getVisible, setVisible)
+
+	def markDirty(self):
+		"""Call after the widget has changed, so it is drawn again"""
+		self.dirty = True
+		parent = getattr(self, "parent", False)
+		if parent != False:
+			parent.dirty = True
+
+	def imageChanged(self):
+		"""Call after drawing onto the image and straight to the screen
+		   as well. The screen is right, but the window is not"""
+		if self.parent != False:
+			self.parent.dirty = True
 
 # place the standard items here, starting with a label
 class CLabel(CWidget):
@@ -74,48 +114,26 @@ class CLabel(CWidget):
 			image=pygame.Surface((self.rect. w,self.rect.h))
 			image.fill(self.background_colour)
 	
-	# code for the following routine taken from the Pygame code repository.
-	# written by David Clark, amended by Chris Handy
 	def buildLabel(self):
 		"""Called to redraw the text on the label
 		   Returns false (and displays message on console) if
 		   the new text will not fit the image. (possible on low res)"""
-		final_lines = []
-		requested_lines = self.text.splitlines()
-		# Create a series of lines that will fit on the provided rectangle
-		for requested_line in requested_lines:
-			if SGFX.gui.fonts[self.font].size(requested_line)[0] > self.rect.w:
-				words = requested_line.split(' ')
-				# if any of our words are too long to fit, return.
-				for word in words:
-					if SGFX.gui.fonts[self.font].size(word)[0] >= self.rect.w:
-						print "Error: Word (", word, ") was too long in label"
-						print "       Width was more than ", self.rect.w
-						return(False)
-				# Start a new line
-				accumulated_line = ""
-				for word in words:
-					test_line = accumulated_line + word + " "
-					# Build the line while the words fit.
-					if SGFX.gui.fonts[self.font].size(test_line)[0] < self.rect.w:
-						accumulated_line = test_line
-					else:
-						final_lines.append(accumulated_line)
-						accumulated_line=word + " "
-				final_lines.append(accumulated_line)
-			else:
-				final_lines.append(requested_line)
+		font = SGFX.gui.fonts[self.font]
+		final_lines = STEXT.wrapText(self.text, font, self.rect.w)
+		if final_lines == None:
+			print "Error: Text was too wide for label"
+			return False
 		# Let's try to write the text out on the surface.
 		self.image=pygame.Surface((self.rect.w, self.rect.h))
 		self.image.fill(self.background_colour)
 		accumulated_height = 0
 		for line in final_lines:
-			if accumulated_height + SGFX.gui.fonts[self.font].size(line)[1] >= self.rect.h:
+			if accumulated_height + font.get_height() >= self.rect.h:
 				print "Error: Text string too tall in label"
 				print "       ah=", accumulated_height, " h=", self.rect.h
 				return False
 			if line != "":
-				tempsurface = SGFX.gui.fonts[self.font].render(line, 1, self.text_colour)
+				tempsurface = STEXT.renderLine(line, font, self.text_colour)
 				if self.justification == SPQR.LEFT_JUSTIFY:
 					self.image.blit(tempsurface, (0, accumulated_height))
 				elif self.justification == SPQR.CENTRE_HORIZ:
@@ -125,7 +143,7 @@ class CLabel(CWidget):
 				else:
 					print "Error: Invalid justification value in label"
 					return False
-			accumulated_height += SGFX.gui.fonts[self.font].size(line)[1]
+			accumulated_height += font.get_height()
 		return True
 
 # possibly something even SIMPLER than the label - an image
@@ -355,6 +373,8 @@ class CSlider(CWidget):
 			# mouse button is depressed
 			# we only handle mouse moves though, everything else is ignored
 			while True:
+				# we are outside the main loop, so show the slider ourselves
+				SGFX.gui.flushRender()
 				event = pygame.event.poll()
 				if event.type == MOUSEBUTTONUP and event.button == 1:
 					# time to exit
@@ -398,6 +418,7 @@ class CSlider(CWidget):
 								x = self.parent.rect.x + self.rect.x
 								y = self.parent.rect.y + self.rect.y
 								SGFX.gui.blitSlider(x, y, self.rect.w, self.rect.h, self.image)
+								self.imageChanged()
 								# *finally*, we may have asked for an extra callback...
 								if self.update_function_valid == True:
 									# do the callback
@@ -439,6 +460,8 @@ class CScrollArea(CWidget):
 		# allow for height correction
 		height -= y * 2
 		h = (int)(float((height * height) / (float)(vsize)))
+		# a very long image would leave nothing to grab hold of
+		h = min(max(h, SPQR.SCAREA_MINH), height)
 		self.handle_rect = pygame.Rect(0, y, w, h)
 		# add automatic callbacks
 		self.callbacks.mouse_ldown = self.scrollareaMouseLDown
@@ -541,9 +564,12 @@ class CScrollArea(CWidget):
 		# then the slider knob:
 		self.image.blit(self.handle_image,
 			(self.handle_rect.x, self.handle_rect.y))
-		# now blit it
-		self.image.blit(self.display_image,
-			(x, y), (0, self.display_ypos, w, h))
+		# now blit it. The rows of an item list draw themselves
+		if isinstance(self.display_image, CListRows):
+			self.display_image.blitTo(self.image, (x, y), (0, self.display_ypos, w, h))
+		else:
+			self.image.blit(self.display_image,
+				(x, y), (0, self.display_ypos, w, h))
 		# blitting to screen is left to you -
 		# mainly because the parent attributes (i.e. the window details)
 		# may not have actually been defined at this point in time
@@ -559,6 +585,8 @@ class CScrollArea(CWidget):
 			# mouse button is depressed
 			# we only handle mouse moves though, everything else is ignored
 			while True:
+				# we are outside the main loop, so show the area ourselves
+				SGFX.gui.flushRender()
 				event = pygame.event.poll()
 				if event.type == MOUSEBUTTONUP and event.button == 1:
 					# time to exit
@@ -574,7 +602,12 @@ class CScrollArea(CWidget):
 		   moment, just checks the arrows at the top and bottom"""
 		# firstly, check we are in the right area
 		if xpos < self.handle_rect.x:
-			# nothing to do
+			# clicking a row of an item list selects it
+			if isinstance(self.display_image, CListRows):
+				if self.border == True:
+					ypos -= 1
+				self.display_image.select(self.display_image.rowAt(ypos + self.display_ypos))
+				self.updateScrollImage(self.display_image)
 			return True
 		# at top or bottom... or nowhere?
 		if ypos < self.lower_bound:
@@ -614,6 +647,7 @@ class CScrollArea(CWidget):
 		x = self.parent.rect.x + self.rect.x
 		y = self.parent.rect.y + self.rect.y
 		SGFX.gui.blitScrollarea(x, y, self.rect.w, self.rect.h, self.image)
+		self.imageChanged()
 		return True
 
 	def updateScrollImage(self, image):
@@ -624,8 +658,233 @@ class CScrollArea(CWidget):
 		x = self.parent.rect.x + self.rect.x
 		y = self.parent.rect.y + self.rect.y
 		SGFX.gui.blitScrollarea(x, y, self.rect.w, self.rect.h, self.image)
+		self.imageChanged()
+		return True
+
+# the rows of an item list come from a row source. They are only asked
+# for as they come into view, so a list can hold any number of rows
+class CRowSource(object):
+	"""Base class for the rows of an item list. types says wether each
+	   column is text (True) or an image (False), and headers gives the
+	   column titles. Override ids(), cells() and key() (or compare())"""
+	def __init__(self, types, headers):
+		self.types = types
+		self.headers = headers
+
+	def ids(self):
+		"""Return a list of the id value of every row"""
+		return []
+
+	def cells(self, id_value):
+		"""Return what goes in each column of the row: a string for a
+		   text column, or an image for an image column"""
+		return []
+
+	def compare(self, column):
+		"""Return a routine to compare 2 id values by the column, for sort()"""
+		return cmp
+
+	def key(self, column):
+		"""Return a routine that gives the sort key of an id value in the
+		   column. The keys are kept until the row changes"""
+		return cmp_to_key(self.compare(column))
+
+	def widths(self):
+		"""Return the width of the widest item in each column. This looks
+		   at every row, so override it if you can work it out quicker"""
+		font = SGFX.gui.fonts[SPQR.FONT_VERA]
+		sizes = [0] * len(self.types)
+		for id_value in self.ids():
+			index = 0
+			for cell in self.cells(id_value):
+				if self.types[index] == True:
+					size = STEXT.textWidth(font, cell)
+				else:
+					size = cell.get_width()
+				if size > sizes[index]:
+					sizes[index] = size
+				index += 1
+		return sizes
+
+class CColumnSource(CRowSource):
+	"""Row source for data given as lists, as CItemList has always
+	   taken it: elements is the list of column types, the list of
+	   headers and then a list for each column. sorts is a list of the
+	   routines to sort by each column, and id_values the id of each row"""
+	def __init__(self, elements, sorts, id_values):
+		CRowSource.__init__(self, elements[0], elements[1])
+		self.columns = elements[2:]
+		self.sorts = sorts
+		self.id_values = list(id_values)
+		# so we can find the row of an id value
+		self.index = {}
+		for row, id_value in enumerate(self.id_values):
+			self.index[id_value] = row
+
+	def ids(self):
+		return list(self.id_values)
+
+	def cells(self, id_value):
+		row = self.index[id_value]
+		return [i[row] for i in self.columns]
+
+	def compare(self, column):
+		return self.sorts[column]
+
+class CListRows(object):
+	"""The rows of an item list, which look to the scroll area like one
+	   tall image. However, only the rows that can be seen (and a few
+	   either side) are ever drawn, and then kept in a cache. The order
+	   of the rows is just a list of their id values, so sorting the list
+	   means drawing nothing new. Rows are always known by their id, so
+	   the selected row stays selected however the list is sorted"""
+	def __init__(self, source, columns, width, row_height, background):
+		self.source = source
+		self.order = source.ids()
+		# the x position of each column in a row
+		self.columns = columns
+		self.width = width
+		self.row_height = row_height
+		# every row is drawn over this
+		self.background = background
+		self.cache = SLRU.CLRUCache(SPQR.ROW_CACHE)
+		# the column we are sorted by (None if not sorted), and wether
+		# it is high to low
+		self.column = None
+		self.reverse = False
+		# the sort key routine for each column sorted by so far, and
+		# the keys of every row in that column
+		self.key_routines = {}
+		self.keys = {}
+		# id value of the selected row, or None
+		self.selected = None
+
+	def get_width(self):
+		return self.width
+
+	def get_height(self):
+		return self.row_height * len(self.order)
+
+	def row(self, id_value):
+		"""Return the image of the row"""
+		image = self.cache.get(id_value)
+		if image == None:
+			image = self.cache.put(id_value, self.drawRow(id_value))
+		return image
+
+	def drawRow(self, id_value):
+		"""Draw the row, centering each item vertically"""
+		image = self.background.copy()
+		if id_value == self.selected:
+			image.fill(SPQR.MENU_HLCOL)
+			pygame.draw.line(image, SPQR.SEP_DARK, (0, self.row_height - 1),
+				(self.width, self.row_height - 1), 1)
+		font = SGFX.gui.fonts[SPQR.FONT_VERA]
+		index = 0
+		for cell in self.source.cells(id_value):
+			if self.source.types[index] == True:
+				cell = STEXT.renderLine(cell, font, SPQR.COL_BLACK)
+			yoff = (self.row_height - cell.get_height()) / 2
+			image.blit(cell, (self.columns[index], yoff))
+			index += 1
+		return image
+
+	def columnKeys(self, column):
+		"""Return the sort keys of every row in the column"""
+		keys = self.keys.get(column)
+		if keys == None:
+			routine = self.source.key(column)
+			keys = dict([[i, routine(i)] for i in self.order])
+			self.key_routines[column] = routine
+			self.keys[column] = keys
+		return keys
+
+	def sortBy(self, column):
+		"""Sort the rows by the column, low to high. If they are already
+		   sorted by it, just swap the order around"""
+		if column == self.column:
+			self.order.reverse()
+			self.reverse = not self.reverse
+			return True
+		keys = self.columnKeys(column)
+		self.order.sort(key = keys.__getitem__)
+		self.column = column
+		self.reverse = False
+		return True
+
+	def changed(self, id_value = None):
+		"""Call when a row has changed, or with no id if they all have.
+		   A single row is moved to it's new place in the sort order,
+		   without sorting the whole list again"""
+		if id_value == None:
+			self.cache.clear()
+			self.keys = {}
+			if self.column != None:
+				column = self.column
+				reverse = self.reverse
+				self.column = None
+				self.sortBy(column)
+				if reverse == True:
+					self.sortBy(column)
+			return True
+		if id_value not in self.order:
+			return False
+		self.cache.values.pop(id_value, None)
+		# every column sorted by so far gets the new key of the row
+		for column, keys in self.keys.iteritems():
+			keys[id_value] = self.key_routines[column](id_value)
+		if self.column == None:
+			return True
+		# take the row out and find where it goes now, after any rows
+		# with the same key
+		self.order.remove(id_value)
+		keys = self.keys[self.column]
+		new = keys[id_value]
+		low = 0
+		high = len(self.order)
+		while low < high:
+			middle = (low + high) // 2
+			if self.reverse == True:
+				before = new > keys[self.order[middle]]
+			else:
+				before = new < keys[self.order[middle]]
+			if before == True:
+				high = middle
+			else:
+				low = middle + 1
+		self.order.insert(low, id_value)
 		return True
 
+	def select(self, id_value):
+		"""Select the row with the id value, or None for no row"""
+		self.cache.values.pop(self.selected, None)
+		self.selected = id_value
+		self.cache.values.pop(id_value, None)
+		return True
+
+	def rowAt(self, ypos):
+		"""Return the id value of the row at ypos, or None"""
+		index = ypos // self.row_height
+		if ypos < 0 or index >= len(self.order):
+			return None
+		return self.order[index]
+
+	def blitTo(self, surface, dest, area):
+		"""Draw the area of the rows (as if they were one image) onto
+		   the surface at dest, as surface.blit() would"""
+		area = pygame.Rect(area)
+		clip = surface.get_clip()
+		surface.set_clip(pygame.Rect(dest[0], dest[1], area.w, area.h).clip(clip))
+		first = (area.y // self.row_height) - SPQR.ROW_OVERSCAN
+		last = ((area.bottom - 1) // self.row_height) + 1 + SPQR.ROW_OVERSCAN
+		for index in range(max(first, 0), min(last, len(self.order))):
+			# the overscan rows are drawn now, ready for when they are seen
+			image = self.row(self.order[index])
+			ypos = (index * self.row_height) - area.y
+			if ypos + self.row_height > 0 and ypos < area.h:
+				surface.blit(image, (dest[0] - area.x, dest[1] + ypos))
+		surface.set_clip(clip)
+
 class CItemList(CWidget):
 	"""Call the init routine with the following parameters:
 	   first a list of lists, defined in the following way:
@@ -637,12 +896,19 @@ class CItemList(CWidget):
 	   Then comes an array of routines to sort the data
 	   Next comes a list of id numbers, used when sorting the data
 	   Finally, the last param tells you what height you would like
-	   the element to take up (including the header height)"""
+	   the element to take up (including the header height)
+	   Instead of the lists, you can pass a CRowSource as elements (with
+	   sorts and id_values as None). Either way, only the rows that can
+	   be seen are drawn, so the list can be as long as you like"""
 	def __init__(self, x, y, elements, sorts, id_values, total_height):
 		# let's do the easy stuff first - this will be a long routine
 		CWidget.__init__(self, pygame.Rect(x, y, 0, 0),
 						 SPQR.WT_ITEMLIST, None, "CItemList")
 		self.data = []
+		if isinstance(elements, CRowSource):
+			self.source = elements
+		else:
+			self.source = CColumnSource(elements, sorts, id_values)
 
 		# ok, let's now do everything else
 		# the most important thing we need to do is figure out the
@@ -654,43 +920,15 @@ class CItemList(CWidget):
 		# the extra complication is in the size of the header
 		# each headline piece of text must be at least of the size
 		# HALFSPCR+text_size+(2*(SPACER))
-		
-		# firstly, let's grab the list that tells us what the types are
-		item_type = elements.pop(0)
-		# and the text headers
-		text_headers = elements.pop(0)
-		# how many rows here? Needed later...
-		total_rows = len(elements[0])
-		# now we need to go down every column and calculate the maximum size
-		column_size = []
-		# index for counting item types
-		it = 0
-		for column in elements:
-			# now we have a list that contains each item for the column
-			csize = 0
-			# what sort of thing is it?
-			ctype = item_type[it]
-			it += 1
-			if ctype == False:
-				# easy, it's an image
-				for item in column:
-					if item.get_width() > csize:
-						csize = item.get_width()
-			else:
-				# must be text
-				for item in column:
-					tsize = SGFX.gui.fonts[SPQR.FONT_VERA].size(item)
-					if tsize[0] > csize:
-						csize = tsize[0]
-			# now we know the size, just expand it:
-			csize += 2 * SPQR.SPACER
-			column_size.append(csize)
+		item_type = self.source.types
+		text_headers = self.source.headers
+		column_size = [i + (2 * SPQR.SPACER) for i in self.source.widths()]
 			
 		# now we have the right widths for all of the items
 		# let's do a similar thing for the widths of the text headers
 		tsize = []
 		for text in text_headers:
-			width = SGFX.gui.fonts[SPQR.FONT_VERA_SM].size(text)[0]
+			width = STEXT.textWidth(SGFX.gui.fonts[SPQR.FONT_VERA_SM], text)
 			# allow some spacing
 			width += SPQR.HALFSPCR + (2 * SPQR.SPACER)
 			tsize.append(width)
@@ -708,7 +946,10 @@ class CItemList(CWidget):
 		# we also need to check out the heights of the rows
 		# since each row is the same size, then we only need to
 		# look at any one particular row - in this case the first one
-		row_height = 0
+		ids = self.source.ids()
+		first = []
+		if ids != []:
+			first = self.source.cells(ids[0])
 		it = 0
 		theight = 0
 		# we have (2*SPACER) as vertical spacing
@@ -716,9 +957,10 @@ class CItemList(CWidget):
 		for column in item_type:
 			if column == False:
 				# image, easy:
-				h = elements[it][0].get_height() + spacing
-				if h > theight:
-					theight = h
+				if first != []:
+					h = first[it].get_height() + spacing
+					if h > theight:
+						theight = h
 			else:
 				# text, a bit more complex
 				h = SGFX.gui.fonts[SPQR.FONT_VERA].size("Aq")[1] + spacing
@@ -726,8 +968,7 @@ class CItemList(CWidget):
 					theight = h
 			it += 1
 
-		# now we can work out the height and width of the ScrollArea
-		height = theight * len(elements[0])
+		# now we can work out the width of the ScrollArea
 		width = 0
 		# we should save the column size as the first thing in the window
 		# data storage area as well
@@ -769,61 +1010,13 @@ class CItemList(CWidget):
 				xsize_blit -= SPQR.GRADBAR_WIDTH
 		# finally, draw in the bottom line
 		pygame.draw.line(row_image, SPQR.SEP_DARK, (0, theight - 1), (width, theight - 1), 1)
+		background = pygame.Surface((width, theight))
+		background.fill(SPQR.BGUI_COL)
+		background.blit(row_image, (0, 0))
 		
-		# Finally!! We can now build up the ScrollArea image
-		# we'll do this a column at a time, since that's the way the
-		# data is given to us in the lists
-		# firstly, get the basic image
-		sc_image = pygame.Surface((width, height), SRCALPHA)
-		sc_image.fill(SPQR.BGUI_COL)
-		# fill in the base row images
-		count = 0
-		ypos = 0
-		while count < total_rows:
-			sc_image.blit(row_image, (0, ypos))
-			ypos += row_image.get_height()
-			count += 1
-
-		# set index for column width
-		it = 0
-		# all items are offset by SPACER. Since the arithmatic is
-		# acummulative, we set that offset here
-		base_x = SPQR.SPACER
-		# now go down each column
-		for column in elements:
-			# point to next column
-			base_x += column_width[it]
-			it += 1
-			# get the base image:
-			ctype = item_type.pop(0)
-			if ctype == False:
-				# it's already images, easy stuff...
-				base_y = 0
-				for i in column:
-					yoff = (theight - i.get_height()) / 2
-					# blit the image
-					sc_image.blit(i,(base_x, base_y+yoff))
-					base_y += theight
-			else:
-				# it's text, so make the image first
-				base_y = 0
-				for i in column:
-					timg = SGFX.gui.fonts[SPQR.FONT_VERA].render(i, True, SPQR.COL_BLACK)
-					yoff = (theight - timg.get_height()) / 2
-					# blit the text
-					sc_image.blit(timg, (base_x, base_y + yoff))
-					base_y += theight
-		
-		# because we may have to re-order the list, then we need
-		# to store some copy of it. We do this by saving each row
-		# as a seperate graphic:
-		rows = []
-		ypos = 0
-		while ypos < sc_image.get_height():
-			img = pygame.Surface((width, theight))
-			img.blit(sc_image, (0, 0), (0, ypos, width, theight))
-			rows.append((id_values.pop(0), img))
-			ypos += theight
+		# all items are offset by SPACER from the start of their column
+		columns = [SPQR.SPACER + i for i in l[:-1]]
+		self.rows = CListRows(self.source, columns, width, theight, background)
 		# save that info for another time...
 		self.row_height = theight
 		self.display_width = width
@@ -833,12 +1026,7 @@ class CItemList(CWidget):
 		# Let's draw the main header first
 		# start by getting the tallest text item and then adding
 		# SPACER to it:
-		hheight = 0
-		for i in text_headers:
-			t = SGFX.gui.fonts[SPQR.FONT_VERA_SM].size(i)
-			if t[1] > hheight:
-				hheight = t[1]
-		hheight += SPQR.SPACER
+		hheight = SGFX.gui.fonts[SPQR.FONT_VERA_SM].get_height() + SPQR.SPACER
 		# create the base image
 		header_img = pygame.Surface((width, hheight), SRCALPHA)
 		header_img.fill(SPQR.BGUI_COL)
@@ -856,7 +1044,7 @@ class CItemList(CWidget):
 			# point to next column
 			new_x = column_width.pop(0)
 			base_x += new_x
-			timg = SGFX.gui.fonts[SPQR.FONT_VERA_SM].render(txt, True, SPQR.COL_BLACK)
+			timg = STEXT.renderLine(txt, SGFX.gui.fonts[SPQR.FONT_VERA_SM], SPQR.COL_BLACK)
 			base_y = (hheight - timg.get_height()) / 2
 			header_img.blit(timg, (base_x, base_y))
 			# we also need to draw those funky lines
@@ -885,10 +1073,10 @@ class CItemList(CWidget):
 			print "Error: Size for ItemList too small"
 			# do it, but nasty things may happen
 			# probably the widget display will look nasty
-			sc_h = sc_image.get_height()/2
+			sc_h = self.rows.get_height()/2
 		# we always have a border on these scroll areas
 		y += hheight
-		self.listarea = CScrollArea(x, y, width, sc_h, sc_image, True)
+		self.listarea = CScrollArea(x, y, width, sc_h, self.rows, True)
 		
 		# we need to put in the callbacks.
 		self.callbacks.mouse_lclk = self.itemsHeaderClick
@@ -899,10 +1087,6 @@ class CItemList(CWidget):
 		for i in self.data[0]:
 			head.append(True)
 		self.data.append(head)
-		# then add the list of id/image collections
-		self.data.append(rows)
-		# save the sort routines and then we are done
-		self.data.append(sorts)
 
 	def itemsHeaderClick(self,handle,xpos,ypos):
 		"""Routine called when ItemList top header amount is clicked"""
@@ -918,15 +1102,16 @@ class CItemList(CWidget):
 		# just a test for now
 		# now we know that we can draw in the arrow
 		# we also have to delete the other arrows
+		# sort the list. We only sort the id values, the row images
+		# we already have stay as they are. Clicking the same column
+		# again reverses the order
+		self.rows.sortBy(column)
 		# what arrow graphic do we use?
-		if self.data[1][column] == True:
+		if self.rows.reverse == False:
 			arrow = SGFX.gui.image("arrown_down")
-			# invert for next time
-			self.data[1][column] = False
 		else:
-			# similar code
 			arrow = SGFX.gui.image("arrow_up")
-			self.data[1][column] = True
+		self.data[1][column] = not self.rows.reverse
 		
 		# create another image to blit over the other arrows
 		erase = pygame.Surface((arrow.get_width(), arrow.get_height()))
@@ -946,35 +1131,38 @@ class CItemList(CWidget):
 		# column along
 		SGFX.gui.screen.blit(arrow, (xoff + self.data[0][column+1], yoff))
 		
-		# now we can re-build the scrollarea image:
-		img = pygame.Surface((self.display_width,
-			self.row_height * len(self.data[2])))
-
-		# now sort the list
-		# we can actually only sort the id numbers, so get that list:
-		nums = []
-		for i in self.data[2]:
-			nums.append(i[0])		
-		# sort *that* list:
-		nums.sort(self.data[3][column])
-		# if column data is True, reverse the list	
-		if self.data[1][column] == True:
-			nums.reverse()
-		
-		# now build up the new image
-		ypos = 0
-		for foo in nums:
-			# get the referrring id value:
-			for bar in self.data[2]:
-				if foo == bar[0]:
-					img.blit(bar[1], (0, ypos))
-					ypos += self.row_height
-					break
-		# update the screen (don't forget to reset xpos accuratly -
-		# thus all that spacer stuff)
-		pygame.display.update((xoff + SPQR.SPACER + SPQR.HALFSPCR, yoff, self.rect.w, self.rect.h))
-		# and the new scrollist image		
-		self.listarea.updateScrollImage(img)
+		# update the screen at the end of the frame (don't forget to
+		# reset xpos accuratly - thus all that spacer stuff)
+		SGFX.gui.update_rects.append(pygame.Rect(xoff + SPQR.SPACER + SPQR.HALFSPCR,
+												 yoff, self.rect.w, self.rect.h))
+		# and show the rows in their new order
+		self.listarea.updateScrollImage(self.rows)
+		return True
+
+	def getSelected(self):
+		return self.rows.selected
+
+	def setSelected(self, id_value):
+		self.rows.select(id_value)
+		self.showRows()
+
+	# the id value of the selected row, or None
+	selected = property(getSelected, setSelected)
+
+	def rowChanged(self, id_value = None):
+		"""Call when the data of a row has changed, or with no id value
+		   if it all has. Returns False if there is no such row"""
+		if self.rows.changed(id_value) == False:
+			return False
+		self.showRows()
+		return True
+
+	def showRows(self):
+		"""Draw the rows again, if the list is in a window"""
+		if self.listarea.parent != False:
+			self.listarea.updateScrollImage(self.rows)
+		else:
+			self.listarea.updateScrollArea()
 		return True
 
 # an optionmenu is a widget that let's you choose an item from a drop-down
@@ -1129,6 +1317,8 @@ class COptionMenu(CWidget):
 		# loop through events until user clicks inside the new rect
 		img_old = pygame.Surface((self.himage.get_width(), self.himage.get_height()))
 		while True:
+			# we are outside the main loop, so show the menu ourselves
+			SGFX.gui.flushRender()
 			event = pygame.event.poll()
 			if event.type == MOUSEMOTION:
 				over = False
@@ -1145,19 +1335,19 @@ class COptionMenu(CWidget):
 								# *something* was highlighted last time,
 								# so put back the original
 								SGFX.gui.screen.blit(img_old, opt_highlight)
-								pygame.display.update(opt_highlight)
+								SGFX.gui.update_rects.append(opt_highlight)
 							# save the old screen part
 							img_old.blit(pygame.display.get_surface(), (0, 0), rect)
 							# draw in the new highlight
 							SGFX.gui.screen.blit(self.himage, rect)
-							pygame.display.update(rect)
+							SGFX.gui.update_rects.append(rect)
 							# save position for next time
 							opt_highlight = rect
 						break
 				if over == False and opt_highlight != None:
 					# left highlight area
 					SGFX.gui.screen.blit(img_old, opt_highlight)
-					pygame.display.update(opt_highlight)
+					SGFX.gui.update_rects.append(opt_highlight)
 					opt_highlight = None
 			elif event.type == MOUSEBUTTONUP and event.button == 1:
 				# click, but inside the rect?
@@ -1187,7 +1377,8 @@ class COptionMenu(CWidget):
 						ypos = self.parent.rect.y + self.rect.y
 						SGFX.gui.screen.blit(self.image, (xpos, ypos))
 						new_update = pygame.Rect(xpos, ypos, self.rect.w, self.rect.h)
-						pygame.display.update(new_update)
+						SGFX.gui.update_rects.append(new_update)
+						self.imageChanged()
 						# you can now return safely - it's been updated!
 						return True
 				# no click on an option, we assume nothing was wanted
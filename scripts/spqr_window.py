@@ -21,10 +21,88 @@ from pygame.locals import *
 import spqr_defines as SPQR
 import spqr_widgets as SWIDGET
 import spqr_gui as SGFX
+import spqr_lru as SLRU
 
 # at the moment, you have to allow for the borders when you create a new window
 # sorry about, it's definitly on the TODO list
 
+# the edges of the window frame, tiled once to be as long as any window
+# could need, by the name of the large image
+strips = {}
+# finished window frames, without the title, by (width, height)
+frames = SLRU.CLRUCache(SPQR.FRAME_CACHE)
+
+def edgeStrip(large, small, length, vertical):
+	"""Return an edge of the window frame at least length pixels long.
+	   It's tiled from the large (4 pixel) images, and the small (1 pixel)
+	   ones for what's left over, and then kept for the next window"""
+	strip = strips.get(large)
+	if strip != None:
+		if vertical == True and strip.get_height() >= length:
+			return strip
+		if vertical == False and strip.get_width() >= length:
+			return strip
+	# never build a strip shorter than the screen
+	length = max(length, SPQR.SCREEN_WIDTH, SPQR.SCREEN_HEIGHT)
+	image = SGFX.gui.image(large)
+	step = image.get_height() if vertical == True else image.get_width()
+	if vertical == True:
+		strip = pygame.Surface((image.get_width(), length)).convert()
+	else:
+		strip = pygame.Surface((length, image.get_height())).convert()
+	strip.fill(SPQR.BGUI_COL)
+	offset = 0
+	while offset + step <= length:
+		if vertical == True:
+			strip.blit(image, (0, offset))
+		else:
+			strip.blit(image, (offset, 0))
+		offset += step
+	image = SGFX.gui.image(small)
+	while offset < length:
+		if vertical == True:
+			strip.blit(image, (0, offset))
+		else:
+			strip.blit(image, (offset, 0))
+		offset += 1
+	strips[large] = strip
+	return strip
+
+def buildFrame(width, height):
+	"""Draw a window frame of the given size. Each side is a single
+	   blit of it's edge strip, and then the 4 corners go on top"""
+	gui = SGFX.gui
+	frame = pygame.Surface((width, height)).convert()
+	frame.fill(SPQR.BGUI_COL)
+	# the sides start under the top left corner
+	top = gui.iHeight("win_tl")
+	area = pygame.Rect(0, 0, gui.iWidth("win_lft"), height - top)
+	frame.blit(edgeStrip("win_lft_lg", "win_lft", area.h, True), (0, top), area)
+	area.w = gui.iWidth("win_rgt")
+	frame.blit(edgeStrip("win_rgt_lg", "win_rgt", area.h, True),
+			   (width - gui.iWidth("win_rgt"), top), area)
+	# and the top and bottom start right of it
+	left = gui.iWidth("win_tl")
+	area = pygame.Rect(0, 0, width - left, gui.iHeight("win_top"))
+	frame.blit(edgeStrip("win_top_lg", "win_top", area.w, False), (left, 0), area)
+	area.h = gui.iHeight("win_bot")
+	frame.blit(edgeStrip("win_bot_lg", "win_bot", area.w, False),
+			   (left, height - gui.iHeight("win_bot")), area)
+	# now draw in all of the corners
+	frame.blit(gui.image("win_tl"), (0, 0))
+	frame.blit(gui.image("win_bl"), (0, height - gui.iHeight("win_bl")))
+	frame.blit(gui.image("win_br"), (width - gui.iWidth("win_br"), height - gui.iHeight("win_bl")))
+	frame.blit(gui.image("win_tr"), (width - gui.iWidth("win_br"), 0))
+	return frame
+
+def windowFrame(width, height):
+	"""Return the frame for a window of the given size, drawing it only
+	   if we don't have one already. Don't draw on it: copy it first"""
+	frame = frames.get((width, height))
+	if frame == None:
+		frame = frames.put((width, height), buildFrame(width, height))
+	return frame
+
 # a simple class that defines button text, active key and event to run
 # when adding buttons to bottom of a window
 class CButtonDetails(object):
@@ -67,65 +145,18 @@ class CWindow(object):
 		self.caption = title
 		# finally, we need a list of the items...
 		self.items = []
+		# the window with all of it's items drawn on, as built by drawWindow()
+		# It's built again if dirty is True, which happens when the image
+		# changes or any of the items do
+		self.composite = None
+		self.dirty = True
 		# get an image of the required size
 		self.image = pygame.Surface((self.rect.w, self.rect.h))
 		# now lets actually draw the window, if needed
 		if draw == True:
-			# flood fill it with grey and get a standard rectangle
-			self.image.fill(SPQR.BGUI_COL)
-			rect = pygame.Rect((0, 0, 0, 0))
-			# ok, we start with the sides, with some clever blitting
-			# basically blit 4*4 images until you can only do 4*1 ones
-			rect.x = 0
-			rect.y = SGFX.gui.iHeight("win_tl")
-			lrg_draw = int((self.rect.h - rect.y) / 4)
-			sml_draw = (self.rect.h - rect.y) - (lrg_draw * 4)
-			offset = self.rect.w - SGFX.gui.iWidth("win_rgt")
-			for i in range(lrg_draw):
-				# blit the large images
-				self.image.blit(SGFX.gui.image("win_lft_lg"), rect)
-				rect.x += offset
-				self.image.blit(SGFX.gui.image("win_rgt_lg"), rect)
-				rect.x -= offset	
-				rect.y += 4
-			# ok, now the final small ones
-			if sml_draw != 0:
-				for i in range(sml_draw):
-					self.image.blit(SGFX.gui.image("win_lft"), rect)
-					rect.x += offset
-					self.image.blit(SGFX.gui.image("win_rgt"), rect)
-					rect.x -= offset
-					rect.y += 1
-			# same sort of routine for the top and bottom
-			rect.y = 0
-			rect.x = SGFX.gui.iWidth("win_tl")
-			lrg_draw = int((self.rect.w - rect.x) / 4)
-			sml_draw = (self.rect.w - rect.x)-(lrg_draw * 4)
-			offset = self.rect.h - SGFX.gui.iHeight("win_bot")
-			for i in range(lrg_draw):
-				# again, the large blits (as can be seen from their name)
-				self.image.blit(SGFX.gui.image("win_top_lg"), rect)
-				rect.y += offset
-				self.image.blit(SGFX.gui.image("win_bot_lg"), rect)
-				rect.y -= offset
-				rect.x += 4
-			# then the small top/bottom fillers
-			if sml_draw != 0:
-				for i in range(sml_draw):
-					self.image.blit(SGFX.gui.image("win_top"), rect)
-					rect.y += offset
-					self.image.blit(SGFX.gui.image("win_bot"), rect)
-					rect.y -= offset
-					rect.x += 1
-			# now draw in all of the corners
+			# the frame is the same for every window of this size
+			self.image = windowFrame(self.rect.w, self.rect.h).copy()
 			rect = pygame.Rect((0, 0, 0, 0))
-			self.image.blit(SGFX.gui.image("win_tl"), rect)
-			rect.y = self.rect.h - SGFX.gui.iHeight("win_bl")
-			self.image.blit(SGFX.gui.image("win_bl"), rect)
-			rect.x = self.rect.w - SGFX.gui.iWidth("win_br")
-			self.image.blit(SGFX.gui.image("win_br"), rect)
-			rect.y = 0
-			self.image.blit(SGFX.gui.image("win_tr"), rect)
 			# right, all that's left to do is draw the text over the title bar
 			# firstly render the text in it's own little gfx area
 			SGFX.gui.fonts[SPQR.FONT_VERA].set_bold(True)
@@ -137,6 +168,15 @@ class CWindow(object):
 			# render to image
 			self.image.blit(title, rect)
 	
+	def getImage(self):
+		return self._image
+
+	def setImage(self, image):
+		self._image = image
+		self.dirty = True
+
+	image = property(getImage, setImage)
+
 	def fillWindowImage(self):
 		"""Sometimes you need a simple window with a background"""
 		self.image=pygame.Surface((self.rect.width, self.rect.height)).convert()
@@ -152,6 +192,7 @@ class CWindow(object):
 	def addWidget(self, new_item):
 		"""Function to add a widget to the window. Call with widget to add""" 	
 		self.items.append(new_item)
+		self.dirty = True
 		# we add to the last item, index is thus len()-1
 		index = len(self.items) - 1
 		# we now have a valid parent to add
@@ -165,16 +206,22 @@ class CWindow(object):
 		return index
 
 	def drawWindow(self):
-		"""Routine draws the entire window and returns the image"""
-		win_img = pygame.Surface((self.rect.w, self.rect.h))
+		"""Routine draws the entire window and returns the image. The
+		   image is kept, and only drawn again when something changes,
+		   so don't draw on it"""
+		if self.dirty == False and self.composite != None:
+			return self.composite
+		if self.composite == None or self.composite.get_size() != self.rect.size:
+			self.composite = pygame.Surface((self.rect.w, self.rect.h))
 		# blit the current window border across
-		win_img.blit(self.image, (0, 0))
+		self.composite.blit(self.image, (0, 0))
 		# now draw all the items
 		for item in self.items:
 			if item.visible == True:
-				win_img.blit(item.image, (item.rect.x, item.rect.y))		
+				self.composite.blit(item.image, (item.rect.x, item.rect.y))		
 		# thats it! pretty simple really.
-		return win_img
+		self.dirty = False
+		return self.composite
 
 	def buildButtonArea(self, button_list, lhs = False):
 		"""Function to add buttons to bottom of a window. The window's size
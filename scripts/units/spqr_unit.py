@@ -14,28 +14,233 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 
+import threading
+from array import array
+
+# the values of every unit are held in a CUnitStore, one typed array for
+# each value and one row for each unit. A CUnit is just a store and a row,
+# so a unit costs a few bytes in each array rather than a whole object
+# with a dict. Copying a store (say for the ai to look ahead) only copies
+# the arrays, and gives back new units that use the copy, so they can be
+# changed without touching the real ones. See docs/unit_memory.txt for
+# the numbers
+
+# A store can also be frozen, which gives a snapshot of it without copying
+# anything. The snapshot shares the arrays with the store, and the store
+# only copies an array when it next needs to change it
+
+# name, typecode and default of every value held in the arrays. Moves
+# and stats are signed, since the maths done on them can go below zero
+COLUMNS = [["moves", 'h', 0],
+		   ["moves_left", 'h', 0],
+		   ["region", 'H', 0],
+		   ["turn_done", 'B', 0],
+		   ["naval", 'B', 0],
+		   ["has_stats", 'B', 0],
+		   ["strength", 'i', 0],
+		   ["quality", 'i', 0],
+		   ["morale", 'i', 0]]
+
+# every array and list in a store
+STORED = [i[0] for i in COLUMNS] + ["names", "images"]
+
+class CUnitStore(object):
+	"""All the values of a set of units"""
+	def __init__(self):
+		for name, code, default in COLUMNS:
+			setattr(self, name, array(code))
+		# names and images are strings, so kept in lists. They are
+		# interned, so every unit with the same image shares the string
+		self.names = []
+		self.images = []
+		# regions are held by number. Every region name gets the next
+		# number the first time a unit of this store goes there; 0 is no
+		# region. Numbers are only ever added, so a snapshot can share these
+		self.region_names = [None]
+		self.region_ids = {None: 0}
+		# the arrays that are shared with a snapshot
+		self.shared = set()
+		self.lock = threading.Lock()
+
+	def __len__(self):
+		return len(self.names)
+
+	def regionId(self, name):
+		"""Return the number for the region name, adding it if needed"""
+		number = self.region_ids.get(name)
+		if number == None:
+			name = intern(name)
+			number = len(self.region_names)
+			self.region_names.append(name)
+			self.region_ids[name] = number
+		return number
+
+	def writable(self, name):
+		"""Return the named array or list, ready to be changed. If a
+		   snapshot shares it, it is copied first"""
+		if name in self.shared:
+			self.lock.acquire()
+			if name in self.shared:
+				setattr(self, name, getattr(self, name)[:])
+				self.shared.discard(name)
+			self.lock.release()
+		return getattr(self, name)
+
+	def freeze(self):
+		"""Return a snapshot of the store as it is now. Don't change it,
+		   as the arrays are shared until this store next changes them"""
+		frozen = CUnitStore()
+		self.lock.acquire()
+		for name in STORED:
+			setattr(frozen, name, getattr(self, name))
+		frozen.region_names = self.region_names
+		frozen.region_ids = self.region_ids
+		self.shared = set(STORED)
+		self.lock.release()
+		return frozen
+
+	def addRow(self, name, image):
+		"""Add a new unit, and return it's row"""
+		for column, code, default in COLUMNS:
+			self.writable(column).append(default)
+		self.writable("names").append(intern(name))
+		self.writable("images").append(intern(image))
+		return len(self.names) - 1
+
+	def copy(self):
+		"""Return a new store with copies of all the values, and a dict
+		   of units that use the new store, by name. If a name has more
+		   than one row (a unit was removed and another added with the
+		   same name) the newest row is used"""
+		store = CUnitStore()
+		for name, code, default in COLUMNS:
+			setattr(store, name, array(code, getattr(self, name)))
+		store.names = list(self.names)
+		store.images = list(self.images)
+		store.region_names = list(self.region_names)
+		store.region_ids = dict(self.region_ids)
+		units = {}
+		for row, name in enumerate(store.names):
+			units[name] = storedUnit(store, row)
+		return store, units
+
+	def memory(self):
+		"""Return the number of bytes used by the arrays and lists"""
+		total = 0
+		for name, code, default in COLUMNS:
+			column = getattr(self, name)
+			total += column.buffer_info()[1] * column.itemsize
+		# the strings themselves are shared, so just count the pointers
+		total += (len(self.names) + len(self.images)) * array('l').itemsize
+		return total
+
+def column(name):
+	"""Return a property for the named array of the unit's store"""
+	def getValue(self):
+		return getattr(self.store, name)[self.row]
+	def setValue(self, value):
+		self.store.writable(name)[self.row] = value
+	return property(getValue, setValue)
+
+def flag(name):
+	"""As column(), but for values that are True or False"""
+	def getValue(self):
+		return getattr(self.store, name)[self.row] == 1
+	def setValue(self, value):
+		if value == True:
+			self.store.writable(name)[self.row] = 1
+		else:
+			self.store.writable(name)[self.row] = 0
+	return property(getValue, setValue)
+
 class unitStats(object):
+	__slots__ = ["strength", "quality", "morale"]
 	def __init__(self, strength, quality, morale):
 		self.strength = strength
 		self.quality = quality
 		self.morale = morale
 
+class CUnitStats(object):
+	"""The stats of a unit, read from and written to the unit's store"""
+	__slots__ = ["store", "row"]
+	strength = column("strength")
+	quality = column("quality")
+	morale = column("morale")
+
+	def __init__(self, store, row):
+		self.store = store
+		self.row = row
+
 class CUnit(object):
 	"""Normally the calling functions read q and m from a file,
 		 hence the odd maths when it calculates morale and quality"""
-	def __init__(self, name, image, move = 4, stats = None, naval = False):
-		self.name = name
+	__slots__ = ["store", "row"]
+	moves = column("moves")
+	moves_left = column("moves_left")
+	turn_done = flag("turn_done")
+	naval = flag("naval")
+
+	def __init__(self, name, image, move = 4, stats = None, naval = False, store = None):
+		# units should go in the store of their map (CMap.store). One
+		# made without a store gets one of it's own
+		if store == None:
+			store = CUnitStore()
+		self.store = store
+		self.row = store.addRow(name, image)
 		self.moves = move
 		self.moves_left = move
-		self.image = image
 		self.stats = stats
 		self.region = None
 		self.turn_done = False
 		self.naval = naval
-		
+
+	@property
+	def name(self):
+		return self.store.names[self.row]
+
+	def getImage(self):
+		return self.store.images[self.row]
+
+	def setImage(self, image):
+		self.store.writable("images")[self.row] = intern(image)
+
+	image = property(getImage, setImage)
+
+	def getRegion(self):
+		return self.store.region_names[self.store.region[self.row]]
+
+	def setRegion(self, region):
+		self.store.writable("region")[self.row] = self.store.regionId(region)
+
+	region = property(getRegion, setRegion)
+
+	def getStats(self):
+		if self.store.has_stats[self.row] == 0:
+			return None
+		return CUnitStats(self.store, self.row)
+
+	def setStats(self, stats):
+		"""Copy the stats into the store, or clear them if None"""
+		if stats == None:
+			self.store.writable("has_stats")[self.row] = 0
+			return
+		self.store.writable("has_stats")[self.row] = 1
+		self.store.writable("strength")[self.row] = stats.strength
+		self.store.writable("quality")[self.row] = stats.quality
+		self.store.writable("morale")[self.row] = stats.morale
+
+	stats = property(getStats, setStats)
+
 	def __str__(self):
 		"""Return a string of the unit details"""
 		text = "  Name: " + self.name
 		text += "\nRegion: " + self.region + "\n"
 		return text
 
+def storedUnit(store, row):
+	"""Return a CUnit for a row already in the store"""
+	unit = CUnit.__new__(CUnit)
+	unit.store = store
+	unit.row = row
+	return unit
+
@@ -30,7 +30,7 @@ SCREEN_WIDTH = 285
 SCREEN_HEIGHT = 192
 
 def setupWindow():
-	SYAML.createWindow("../data/layouts/setup_window.yml")
+	SYAML.createWindow(SPQR.DATA_F + "/layouts/setup_window.yml")
 
 def setupWindow2():
 	# get a fullsize window, and add the options to it
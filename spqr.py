@@ -27,21 +27,34 @@ from scripts import spqr_window as SWINDOW
 from scripts import spqr_widgets as SWIDGET
 from scripts import spqr_menu as SMENU
 from scripts import spqr_events as SEVENT
+from scripts import spqr_headless as SHEADLESS
+from scripts import spqr_replay as SREPLAY
 
 class CSPQR(object):
 	def __init__(self):
 		self.fullscreen = SPQR.FULLSCREEN
 		self.intro = True
 		self.init_only = False
+		self.batch = False
+		self.record = False
+		self.replay = False
 		# init the data
 		SDATA.addUnits()
 		self.sortOptions()
-		SGFX.gui.mainInit(SPQR.SCREEN_WIDTH, SPQR.SCREEN_HEIGHT, self.fullscreen)
-		# actually go any furthur?
+		if self.replay == True:
+			SREPLAY.runReplay()
+			sys.exit(True)
+		if self.record == True:
+			SREPLAY.record(SDATA.data)
+		# actually go any furthur? none of this needs a display
 		if self.init_only == True:
 			# no, so exit here
 			print "SPQR: init() worked fine."
 			sys.exit(True)
+		if self.batch == True:
+			SHEADLESS.runBatch(SPQR.BATCH_TURNS)
+			sys.exit(True)
+		SGFX.gui.mainInit(SPQR.SCREEN_WIDTH, SPQR.SCREEN_HEIGHT, self.fullscreen)
 
 	# TODO: use optparse, don't re-invent the wheel
 	def executeFlag(self, flag):
@@ -61,6 +74,18 @@ class CSPQR(object):
 			# exit after initing data
 			self.init_only = True
 			return True
+		elif flag == 'b':
+			# run turns with no display, then exit
+			self.batch = True
+			return True
+		elif flag == 'r':
+			# record the game, so it can be played back
+			self.record = True
+			return True
+		elif flag == 'p':
+			# play back the last recorded game with no display, then exit
+			self.replay = True
+			return True
 		elif flag == 'v':
 			# show version details and exit
 			print "SPQR " + SPQR.VERSION + ", written and designed by Chris Smith"
@@ -75,6 +100,9 @@ class CSPQR(object):
 			print "  -f : Fullscreen"
 			print "  -n : Skip intro"
 			print "  -t : Test init only"
+			print "  -b : Run " + str(SPQR.BATCH_TURNS) + " turns with no display"
+			print "  -r : Record the game"
+			print "  -p : Play back the recorded game with no display"
 			print "  -v : Show version details"
 			print "  -? : Show this display"
 			# all done, a valid exit point
@@ -257,6 +285,8 @@ class CSPQR(object):
 		SGFX.gui.keyboard.addKey(K_s, SEVENT.menuSave, KMOD_LCTRL)
 		SGFX.gui.keyboard.addKey(K_p, SEVENT.menuPreferences, KMOD_LCTRL)
 		SGFX.gui.keyboard.addKey(K_q, SEVENT.quitSpqr, KMOD_LCTRL)
+		SGFX.gui.keyboard.addKey(K_z, SEVENT.keyUndo, KMOD_LCTRL)
+		SGFX.gui.keyboard.addKey(K_y, SEVENT.keyRedo, KMOD_LCTRL)
 		SGFX.gui.keyboard.addKey(K_F5, SEVENT.menuEmpireStatistics)
 		SGFX.gui.keyboard.addKey(K_a, SEVENT.menuHelpAbout, KMOD_LCTRL)
 		SGFX.gui.keyboard.addKey(K_F1, SEVENT.menuHelpHelp)